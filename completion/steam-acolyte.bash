@@ -0,0 +1,11 @@
+# bash completion for steam-acolyte
+#
+# Install to /usr/share/bash-completion/completions/steam-acolyte, or source
+# from ~/.bashrc.
+
+_steam_acolyte() {
+    local IFS=$'\n'
+    COMPREPLY=($(steam-acolyte-complete "$COMP_CWORD" "${COMP_WORDS[@]}"))
+}
+
+complete -o default -F _steam_acolyte steam-acolyte
@@ -0,0 +1,11 @@
+# fish completion for steam-acolyte
+#
+# Install to /usr/share/fish/vendor_completions.d/steam-acolyte.fish or
+# ~/.config/fish/completions/steam-acolyte.fish.
+
+function __steam_acolyte_complete
+    set -l words (commandline -opc)
+    steam-acolyte-complete (count $words) $words (commandline -ct)
+end
+
+complete -c steam-acolyte -f -a '(__steam_acolyte_complete)'
@@ -0,0 +1,186 @@
+"""
+Account list index, and its compact on-disk snapshot.
+
+The snapshot lives in ``acolyte_data`` and allows to show the user list
+without having to parse steam's config files first. It is rewritten whenever
+the accounts are read from or modified in ``loginusers.vdf``, along with a
+plain list of account names for the shell completion.
+"""
+
+from .util import read_file, write_file_atomic
+
+import json
+import os
+
+
+SNAPSHOT_FILE = 'users.json'
+NAMES_FILE = 'accounts.txt'
+SNAPSHOT_VERSION = 1
+
+
+def sort_key(persona_name, account_name):
+    """Default display order of accounts."""
+    return (persona_name.lower(), account_name.lower())
+
+
+class AccountIndex:
+
+    """Immutable collection of ``SteamUser`` with lookup tables.
+
+    Iterating yields the users in default display order. Other orders can
+    be requested with ``ordered()`` and are cached, so that they are only
+    computed once per index. An index is built once per change of steam's
+    config and shared by all consumers."""
+
+    __slots__ = ('_users', '_by_id', '_by_account', '_by_persona', '_orders',
+                 '_search_keys')
+
+    def __init__(self, users=(), presorted=False):
+        users = tuple(users)
+        if not presorted:
+            users = tuple(sorted(users, key=lambda u: u.sort_key))
+        self._users = users
+        self._by_id = {u.steam_id: u for u in users}
+        self._by_account = {u.account_name.casefold(): u for u in users}
+        self._by_persona = {}
+        for u in users:
+            self._by_persona.setdefault(u.persona_name.casefold(), []).append(u)
+        self._orders = {}
+        self._search_keys = None
+
+    def __iter__(self):
+        return iter(self._users)
+
+    def __len__(self):
+        return len(self._users)
+
+    def __bool__(self):
+        return bool(self._users)
+
+    def __contains__(self, account_name):
+        return account_name.casefold() in self._by_account
+
+    def by_steam_id(self, steam_id):
+        """Return the user with the given steam ID, or ``None``."""
+        return self._by_id.get(steam_id)
+
+    def by_account(self, account_name):
+        """Return the user with the given account name (case-insensitive),
+        or ``None``."""
+        return self._by_account.get(account_name.casefold())
+
+    def by_persona(self, persona_name):
+        """Return list of users with the given persona name
+        (case-insensitive)."""
+        return list(self._by_persona.get(persona_name.casefold(), ()))
+
+    def ordered(self, name, key, tag=None):
+        """Return tuple of users sorted by ``key``. The result is cached under
+        the given name, until it is requested with a different ``tag``."""
+        cached = self._orders.get(name)
+        if cached is None or cached[0] != tag:
+            cached = (tag, tuple(sorted(self._users, key=key)))
+            self._orders[name] = cached
+        return cached[1]
+
+    def matching(self, query, candidates=None):
+        """Return users among ``candidates`` (default: all) whose persona or
+        account name contains ``query`` (case-insensitive)."""
+        if self._search_keys is None:
+            self._search_keys = {
+                u.steam_id: _search_key(u) for u in self._users}
+        keys = self._search_keys
+        query = query.casefold()
+        if candidates is None:
+            candidates = self._users
+        return tuple(u for u in candidates if query in keys[u.steam_id])
+
+    def without(self, account_names):
+        """Return a new index without the given accounts. Cached orders are
+        carried over, rather than being sorted again."""
+        remove = {name.casefold() for name in account_names}
+        keep = [u for u in self._users
+                if u.account_name.casefold() not in remove]
+        index = AccountIndex(keep, presorted=True)
+        index._orders = {
+            name: (tag, tuple(u for u in users
+                              if u.account_name.casefold() not in remove))
+            for name, (tag, users) in self._orders.items()
+        }
+        if self._search_keys is not None:
+            index._search_keys = {
+                u.steam_id: self._search_keys[u.steam_id] for u in keep}
+        return index
+
+
+class AccountFilter:
+
+    """Incremental type-to-filter search over an ``AccountIndex``.
+
+    Typing another character only narrows the previous result, and deleting
+    characters goes back to previously computed results."""
+
+    def __init__(self, index):
+        self.index = index
+        self._stack = [('', tuple(index))]
+
+    @property
+    def matches(self):
+        """Users matching the current query, in default order."""
+        return self._stack[-1][1]
+
+    def update(self, text):
+        """Set query text. Returns the matching users."""
+        query = text.strip().casefold()
+        stack = self._stack
+        while not query.startswith(stack[-1][0]):
+            stack.pop()
+        if query != stack[-1][0]:
+            stack.append((query, self.index.matching(query, stack[-1][1])))
+        return self.matches
+
+
+def _search_key(user):
+    return '{}\0{}'.format(user.persona_name, user.account_name).casefold()
+
+
+def dump_snapshot(users):
+    """Serialize list of ``SteamUser`` to snapshot text. Records are stored
+    in display order, so that they can be shown without sorting."""
+    records = sorted((
+        [u.steam_id, u.account_name, u.persona_name, u.timestamp,
+         sort_key(u.persona_name, u.account_name)]
+        for u in users
+    ), key=lambda r: r[4])
+    return json.dumps({
+        'version': SNAPSHOT_VERSION,
+        'users': records,
+    }, separators=(',', ':'))
+
+
+def dump_names(users):
+    """Return account names as text with one name per line. This file is
+    used for the shell completion."""
+    return ''.join(sorted(u.account_name + '\n' for u in users))
+
+
+def load_snapshot(filename):
+    """Return list of tuples ``(steam_id, account, persona, timestamp)`` in
+    display order from the given snapshot file, or ``None`` if no valid
+    snapshot exists."""
+    text = read_file(filename)
+    if not text:
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if data.get('version') != SNAPSHOT_VERSION:
+        return None
+    return [tuple(record[:4]) for record in data['users']]
+
+
+def save_snapshot(filename, text):
+    """Atomically replace snapshot (or names) file with the given text."""
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    write_file_atomic(filename, text)
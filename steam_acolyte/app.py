@@ -5,7 +5,20 @@ Usage:
     steam-acolyte [options]
     steam-acolyte [options] store
     steam-acolyte [options] switch <USER>
-    steam-acolyte [options] start <USER>
+    steam-acolyte [options] start [--detach] [--app APP] <USER>
+    steam-acolyte [options] remove [--purge] <ACCOUNT>...
+    steam-acolyte [options] undo
+    steam-acolyte [options] sync <DIR>
+    steam-acolyte [options] export <FILE>
+    steam-acolyte [options] import [--dry-run] <FILE>
+    steam-acolyte [options] sandbox <ACCOUNT>...
+    steam-acolyte [options] daemon [--passive] [<USER>]
+    steam-acolyte [options] list
+    steam-acolyte [options] status
+    steam-acolyte [options] current
+    steam-acolyte [options] stats
+    steam-acolyte [options] usage
+    steam-acolyte [options] history
 
 Options:
     -p PREFIX, --prefix PREFIX  Steam prefix (e.g. `~/.steam`). On linux, this
@@ -26,22 +39,62 @@ Options:
     -v, --verbose               Increase verbosity (debug)
 
     -l FILE, --logfile FILE     Log steam output to this file
+
+    --logsize MIB               Rotate the log file when it exceeds this size
+                                (0 means never) [default: 10]
+
+    --logkeep N                 Number of compressed old log files to keep
+                                [default: 5]
+
+    -m, --mru                   Sort users by most recent use
+
+    --prefetch MIB              While waiting for steam to exit before a
+                                login, read ahead up to MIB megabytes of
+                                steam's program files [default: 0]
+
+    -a APP, --app APP           With `start`: launch this app, given by its
+                                ID or (part of) its name
+
+    -d, --detach                With `start`: return immediately rather than
+                                waiting for steam to exit
+
+    --purge                     When removing users (also in the window):
+                                delete their userdata folders in the
+                                background
+
+    -n, --dry-run               With `import`: print the changes to steam's
+                                config files instead of writing them
+
+    --passive                   With `daemon`: don't read steam's output, so
+                                that the daemon does not wake up while steam
+                                runs. Disables log rotation and the detection
+                                of startup milestones
+
+    --hook-timeout SEC          Kill pre-launch and post-exit hooks after this
+                                time (0 means never) [default: 30]
+
+    --hook-budget SEC           Wait at most this long for hooks before
+                                starting steam (0 means no limit) [default: 5]
+
+    --startup-profile           Print wall time of startup stages
+
+    --profile FILE              Save cProfile statistics to this file
+
+    --memprofile FILE           Save tracemalloc snapshots as FILE.NNN-LABEL
 """
 
 from steam_acolyte import __version__
-from steam_acolyte.steam import Steam
-
-from PyQt5.QtCore import QTimer
-from PyQt5.QtWidgets import QApplication
+from steam_acolyte.startup import Startup
+from steam_acolyte import profiling
 
 from docopt import docopt
 
+from concurrent.futures import ThreadPoolExecutor
 import logging.config
 import sys
 
 
 def main(args=None):
-    app = QApplication([])
     opts = docopt(__doc__, args, version=__version__)
     level = 'DEBUG' if opts['--verbose'] else 'INFO'
     logging.config.dictConfig({
@@ -68,56 +121,256 @@ def main(args=None):
         },
     })
 
+    profiling.start(opts['--profile'], opts['--memprofile'])
+
+    for name, convert in [('--prefetch', float), ('--logsize', float),
+                          ('--logkeep', int), ('--hook-timeout', float),
+                          ('--hook-budget', float)]:
+        try:
+            opts[name] = convert(opts[name])
+        except ValueError:
+            print("Invalid value for {}: {!r}".format(name, opts[name]),
+                  file=sys.stderr)
+            return 1
+
+    # Queries must be cheap. Don't load Qt and don't lock anything:
+    if (opts['list'] or opts['status'] or opts['current'] or opts['stats'] or
+            opts['usage'] or opts['history']):
+        from steam_acolyte.query import run_query
+        return run_query(opts)
+
+    # Sandboxes don't interact with the main steam instance or its locks:
+    if opts['sandbox']:
+        from steam_acolyte.sandbox import run_sandboxes
+        return run_sandboxes(opts)
+
+    # Exporting and previewing an import only read steam's config:
+    if opts['export'] or (opts['import'] and opts['--dry-run']):
+        from steam_acolyte.config import SteamConfig
+        try:
+            steam = SteamConfig(
+                opts['--prefix'],
+                opts['--root'],
+                opts['--exe'])
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            return 1
+        return transfer_accounts(steam, opts)
+
+    # The daemon must not load QtWidgets:
+    if opts['daemon']:
+        from PyQt5.QtCore import QThread
+        from steam_acolyte.daemon import run_daemon
+        try:
+            steam = create_steam(opts, QThread.currentThread())
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            return 1
+        steam.scan_output = not opts['--passive']
+        return run_daemon(steam, opts['<USER>'])
+
+    from PyQt5.QtCore import QThread
+    from PyQt5.QtWidgets import QApplication
+
+    cli_mode = (opts['store'] or opts['switch'] or opts['start'] or
+                opts['remove'] or opts['undo'] or opts['sync'] or
+                opts['import'])
+
+    # Locating and parsing steam's config files, and rasterizing icons can
+    # happen concurrently to the initialization of the QApplication:
+    main_thread = QThread.currentThread()
+    pool = ThreadPoolExecutor(max_workers=3)
+    startup = Startup(pool)
+    startup.submit('discover', lambda: create_steam(opts, main_thread))
+    if not cli_mode:
+        users = startup.submit('users', lambda steam: steam.users(),
+                               'discover')
+    app = startup.run('qt', lambda: QApplication([]))
+    if not cli_mode:
+        from steam_acolyte.theme import render_icons
+        startup.submit('icons', lambda app: render_icons(), 'qt')
+    pool.shutdown(wait=False)
+
     try:
-        steam = Steam(
-            opts['--prefix'],
-            opts['--root'],
-            opts['--exe'],
-            opts['--logfile'])
+        steam = startup.result('discover')
     except RuntimeError as e:
         print(e, file=sys.stderr)
         return 1
 
-    cli_mode = opts['store'] or opts['switch'] or opts['start']
-
-    first, locked = steam.lock(['-foreground'])
+    # `store` is also run after steam exits from a detached session, and
+    # must not bring a running acolyte or steam to the foreground:
+    raise_args = None if opts['store'] else ['-foreground']
+    first, locked = startup.run(
+        'lock', lambda steam: steam.lock(raise_args), 'discover')
+    profiling.checkpoint('lock')
     try:
         if not first:
             print("Acolyte is already running. Terminating.")
             return 0
+        if locked:
+            # Roll back edits that were interrupted by a crash:
+            steam.edits.recover()
         if cli_mode:
+            if opts['--startup-profile']:
+                startup.report()
+            args = None
+            prefetcher = None
+            if opts['--app']:
+                try:
+                    app_id = steam.app_index.find(opts['--app']).app_id
+                except KeyError as e:
+                    print(e.args[0], file=sys.stderr)
+                    return 1
+                args = ['-applaunch', app_id]
             if not locked:
                 print("Waiting for steam to exit.")
+                if opts['start']:
+                    prefetcher = steam.prefetch(opts['--prefetch'])
+                steam.pipe_held.connect(print_pipe_holders)
                 steam.wait_for_lock()
-            if opts['switch']:
+                if prefetcher:
+                    # Don't compete with steam's own startup I/O:
+                    prefetcher.cancel()
+                    print("{} while waiting.".format(prefetcher.summary()))
+            if opts['store']:
+                steam.store_users()
+            elif opts['remove']:
+                steam.remove_users(opts['<ACCOUNT>'], purge=opts['--purge'])
+                if opts['--purge']:
+                    # Don't keep steam or acolyte waiting for the deletion:
+                    steam.unlock()
+                    steam.release_acolyte_instance_lock()
+                    purger = steam.purge_trash(print_purge_progress)
+                    if purger:
+                        purger.join()
+            elif opts['undo']:
+                try:
+                    undone = steam.edits.undo()
+                except RuntimeError as e:
+                    print(e, file=sys.stderr)
+                    return 1
+                if undone:
+                    print("Undone: {}".format(undone['desc']))
+                    for warning in undone.get('warn', []):
+                        print("Note: {}".format(warning), file=sys.stderr)
+                else:
+                    print("Nothing to undo.")
+            elif opts['sync']:
+                from steam_acolyte.sync import Sync
+                counts = Sync(steam, opts['<DIR>']).run()
+                print("Exported {exported}, imported {imported}, removed "
+                      "{removed} account(s).".format(**counts))
+            elif opts['import']:
+                return transfer_accounts(steam, opts)
+            elif opts['switch']:
                 steam.switch_user(opts['<USER>'])
             elif opts['start']:
                 steam.switch_user(opts['<USER>'])
+                steam.hooks.run('pre-launch', ACOLYTE_USER=opts['<USER>'])
                 steam.unlock()
-                steam.run().waitForFinished(-1)
-                steam.lock()
+                if opts['--detach']:
+                    steam.run_detached(args)
+                else:
+                    process = steam.run(args)
+                    process.waitForFinished(-1)
+                    profiling.checkpoint('session')
+                    steam.hooks.start(
+                        'post-exit', ACOLYTE_USER=steam.get_last_user(),
+                        ACOLYTE_EXIT_CODE=process.exitCode())
+                    steam.lock()
+                    steam.store_users()
+                    # Don't keep steam or acolyte waiting for the hooks:
+                    steam.unlock()
+                    steam.release_acolyte_instance_lock()
+                    steam.hooks.wait(0)
         else:
             from steam_acolyte.window import LoginDialog
             from steam_acolyte.theme import load_theme
             init_app()
-            window = LoginDialog(steam, load_theme())
-            window.show_trayicon()
+            theme = startup.run('theme', load_theme, 'icons')
+            window = startup.run(
+                'dialog', lambda: LoginDialog(
+                    steam, theme, users, mru=opts['--mru'],
+                    prefetch=opts['--prefetch'], purge=opts['--purge']))
+            startup.run('trayicon', window.show_trayicon)
             try:
                 if locked:
-                    window.show()
+                    startup.run('show', window.show)
                 else:
                     print("Waiting for steam to exit.")
                     window.show_waiting_message()
                     window.wait_for_lock()
+                if opts['--startup-profile']:
+                    startup.report()
                 return app.exec_()
             finally:
                 window.hide_trayicon()
+                window.cancel_hooks()
     except KeyboardInterrupt:
         print()
         return 1
     finally:
         steam.unlock()
         steam.release_acolyte_instance_lock()
+        steam.journal.flush()
+
+
+def create_steam(opts, thread):
+    """Create ``Steam`` object, and transfer it to the given thread. This
+    allows to create the object on a worker thread."""
+    from steam_acolyte.steam import Steam
+    steam = Steam(
+        opts['--prefix'],
+        opts['--root'],
+        opts['--exe'],
+        opts['--logfile'],
+        log_size=int(opts['--logsize'] * 1024 * 1024),
+        log_keep=opts['--logkeep'])
+    steam.hooks.timeout = opts['--hook-timeout']
+    steam.hooks.budget = opts['--hook-budget']
+    steam.moveToThread(thread)
+    return steam
+
+
+def transfer_accounts(steam, opts):
+    """Execute the ``export`` or ``import`` command."""
+    import tarfile
+    from steam_acolyte import archive
+    filename = opts['<FILE>']
+    try:
+        if opts['export']:
+            count = archive.export_accounts(steam, filename)
+            print("Exported {} account(s).".format(count))
+        elif opts['--dry-run']:
+            names, changes = archive.preview_import(steam, filename)
+            archive.print_diff(steam, changes)
+            print("Would import {} account(s): {}".format(
+                len(names), ', '.join(names)), file=sys.stderr)
+        else:
+            names = archive.import_accounts(steam, filename)
+            print("Imported {} account(s): {}".format(
+                len(names), ', '.join(names)))
+    except (OSError, EOFError, ValueError, tarfile.TarError) as e:
+        print("Failed to {} {}: {}".format(
+            'export' if opts['export'] else 'import', filename, e),
+            file=sys.stderr)
+        return 1
+    return 0
+
+
+def print_pipe_holders(holders):
+    """Show which processes keep us from acquiring the steam lock."""
+    for holder in holders:
+        print("Waiting for {} (pid {}) to exit.".format(
+            holder.name, holder.pid))
+
+
+def print_purge_progress(done, total):
+    """Show progress of deleting userdata folders."""
+    percent = 100 * done // total if total else 100
+    end = '\n' if done >= total else ''
+    print("\rDeleting userdata: {}%".format(percent), end=end,
+          file=sys.stderr, flush=True)
 
 
 def init_app():
@@ -133,6 +386,7 @@ def init_app():
 
 
 def except_handler(*args, **kwargs):
+    from PyQt5.QtWidgets import QApplication
     import traceback
     traceback.print_exception(*args, **kwargs)
     QApplication.quit()
@@ -140,6 +394,7 @@ def except_handler(*args, **kwargs):
 
 def interrupt_handler(signum, frame):
     """Handle KeyboardInterrupt: quit application."""
+    from PyQt5.QtWidgets import QApplication
     QApplication.quit()
 
 
@@ -148,6 +403,8 @@ def safe_timer(timeout, func, *args, **kwargs):
     Create a timer that is safe against garbage collection and overlapping
     calls. See: http://ralsina.me/weblog/posts/BB974.html
     """
+    from PyQt5.QtCore import QTimer
+
     def timer_event():
         try:
             func(*args, **kwargs)
@@ -0,0 +1,155 @@
+"""
+Index of installed steam apps.
+
+The apps are found by reading the ``appmanifest_*.acf`` files in all steam
+library folders listed in ``steamapps/libraryfolders.vdf``. The results are
+cached in ``acolyte_data`` along with the modification times of the library
+folders and manifests, so that only changed manifests have to be parsed
+again. Steam replaces manifests by renaming a temporary file, which also
+updates the mtime of the folder, so unchanged folders are not even listed.
+
+This module must not import Qt.
+"""
+
+from .util import read_file, write_file_atomic, subkey_lookup
+
+import vdf
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import re
+
+
+App = namedtuple('App', ['app_id', 'name', 'library'])
+
+CACHE_VERSION = 1
+MANIFEST = re.compile(r'^appmanifest_\d+\.acf$')
+
+
+class AppIndex:
+
+    def __init__(self, root, cache_file):
+        self.root = root
+        self.cache_file = cache_file
+        self._cache = None
+
+    def apps(self):
+        """Return list of installed ``App``, sorted by name. Rescans the
+        libraries for changes."""
+        if self._cache is None:
+            self._cache = self._load_cache()
+        cache = {}
+        todo = []
+        for library in self.library_folders():
+            folder = os.path.join(library, 'steamapps')
+            try:
+                mtime = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+            entry = self._cache.get(folder)
+            if entry is None or entry['mtime'] != mtime:
+                old = entry['manifests'] if entry else {}
+                entry = {'mtime': mtime,
+                         'manifests': _scan_folder(folder, old, todo)}
+            cache[folder] = entry
+
+        if todo:
+            paths = [path for _, _, path, _ in todo]
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                parsed = pool.map(_read_manifest, paths)
+                for (manifests, filename, _, mtime), info in zip(todo, parsed):
+                    manifests[filename] = [mtime, *info]
+
+        if cache != self._cache:
+            self._cache = cache
+            self._save_cache()
+        return sorted((
+            App(app_id, name, folder)
+            for folder, entry in cache.items()
+            for _, app_id, name in entry['manifests'].values()
+            if app_id and name
+        ), key=lambda app: app.name.casefold())
+
+    def find(self, name):
+        """Find an installed app by ID, or by (part of) its name. Raises
+        ``KeyError`` if no app or more than one app matches."""
+        apps = self.apps()
+        query = name.casefold()
+        for matches in (
+                [a for a in apps if a.app_id == name],
+                [a for a in apps if a.name.casefold() == query],
+                [a for a in apps if a.name.casefold().startswith(query)],
+                [a for a in apps if query in a.name.casefold()]):
+            if len(matches) == 1:
+                return matches[0]
+            if matches:
+                raise KeyError("Ambiguous app name {!r}: {}".format(
+                    name, ", ".join(a.name for a in matches)))
+        raise KeyError("No installed app matches {!r}".format(name))
+
+    def library_folders(self):
+        """Return list of steam library folders, including steam's root."""
+        text = read_file(
+            os.path.join(self.root, 'steamapps', 'libraryfolders.vdf'))
+        try:
+            data = vdf.loads(text) if text else {}
+        except SyntaxError:
+            data = {}
+        folders = [self.root]
+        for key, value in subkey_lookup(data, 'libraryfolders').items():
+            if not key.isdigit():
+                continue
+            # Newer steam versions store a dict with additional info:
+            path = value.get('path') if isinstance(value, dict) else value
+            path = path and os.path.realpath(path)
+            if path and path not in folders:
+                folders.append(path)
+        return folders
+
+    def _load_cache(self):
+        try:
+            data = json.loads(read_file(self.cache_file) or '{}')
+        except ValueError:
+            return {}
+        if data.get('version') != CACHE_VERSION:
+            return {}
+        return data['folders']
+
+    def _save_cache(self):
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        write_file_atomic(self.cache_file, json.dumps({
+            'version': CACHE_VERSION,
+            'folders': self._cache,
+        }, separators=(',', ':')))
+
+
+def _scan_folder(folder, old, todo):
+    """Return dict of manifests ``{filename: [mtime, app_id, name]}`` for
+    the given folder, reusing unchanged entries from ``old``. Manifests that
+    need to be read are appended to ``todo``."""
+    manifests = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if not MANIFEST.match(entry.name):
+                continue
+            try:
+                mtime = entry.stat().st_mtime_ns
+            except OSError:
+                continue
+            cached = old.get(entry.name)
+            if cached and cached[0] == mtime:
+                manifests[entry.name] = cached
+            else:
+                todo.append((manifests, entry.name, entry.path, mtime))
+    return manifests
+
+
+def _read_manifest(path):
+    """Return ``(app_id, name)`` from an appmanifest file."""
+    try:
+        state = subkey_lookup(vdf.loads(read_file(path)), 'AppState')
+    except (OSError, SyntaxError, UnicodeDecodeError):
+        return (None, None)
+    return (state.get('appid'), state.get('name'))
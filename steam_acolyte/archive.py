@@ -0,0 +1,133 @@
+"""
+Bulk export and import of saved accounts, e.g. to provision a new machine.
+
+An archive is a gzip compressed tar file with one member
+``accounts/NAME.json`` per account, containing the snapshot of the account
+in the format of the vault, i.e. its entries in ``loginusers.vdf`` and
+``config.vdf``. Archives are written and read as streams, one member at a
+time, so they are never held in memory as a whole.
+
+Archives contain login tokens and should be treated like passwords.
+
+This module must not import Qt.
+"""
+
+from .util import read_binary
+
+import difflib
+import io
+import json
+import logging
+import os
+import sys
+import tarfile
+from time import time
+from urllib.parse import quote
+
+
+PREFIX = 'accounts/'
+
+
+def export_accounts(steam, filename):
+    """Write all accounts in steam's config to an archive. Returns the
+    number of exported accounts. The archive is only readable by its owner,
+    and is replaced atomically, so that a failed export leaves no partial
+    archive behind."""
+    temp = filename + '.tmp'
+    fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    count = 0
+    try:
+        # The mode of open() only applies to new files:
+        if hasattr(os, 'fchmod'):
+            os.fchmod(fd, 0o600)
+        with open(fd, 'wb') as f:
+            with tarfile.open(fileobj=f, mode='w|gz') as tar:
+                now = time()
+                for username, snapshot in steam.snapshots():
+                    _add_member(tar, username, snapshot, now)
+                    count += 1
+        os.replace(temp, filename)
+    except BaseException:
+        os.remove(temp)
+        raise
+    return count
+
+
+def import_accounts(steam, filename):
+    """Merge all accounts of an archive into steam's config. Accounts that
+    exist already are overwritten, others are kept. All changes are applied
+    in one transaction, with one write per config file. Returns the list of
+    imported account names."""
+    with steam.edits.transaction('import ' + filename):
+        names = [_apply(steam, snapshot)
+                 for snapshot in read_archive(filename)]
+    if names:
+        steam.store_users()
+    return names
+
+
+def preview_import(steam, filename):
+    """Determine what ``import_accounts`` would do, without writing
+    anything. Returns the list of account names in the archive, and a dict
+    ``{filename: (old, new)}`` of the contents of the files that would be
+    modified."""
+    with steam.edits.dry_run() as pending:
+        names = [_apply(steam, snapshot)
+                 for snapshot in read_archive(filename)]
+    return names, {
+        path: (read_binary(path), data)
+        for path, data in pending.items()
+    }
+
+
+def read_archive(filename):
+    """Iterate over the snapshots in an archive. Raises ``ValueError`` or
+    ``tarfile.TarError`` if the archive is damaged."""
+    with tarfile.open(filename, mode='r|gz') as tar:
+        for member in tar:
+            if not (member.isfile() and member.name.startswith(PREFIX) and
+                    member.name.endswith('.json')):
+                logging.getLogger(__name__).warning(
+                    "Ignoring unexpected archive member: %s", member.name)
+                continue
+            snapshot = json.loads(tar.extractfile(member).read().decode())
+            if not _is_snapshot(snapshot):
+                raise ValueError(
+                    "Invalid account in archive: {}".format(member.name))
+            yield snapshot
+
+
+def print_diff(steam, changes, file=None):
+    """Print a unified diff of the changes returned by
+    ``preview_import``."""
+    for path, (old, new) in sorted(changes.items()):
+        name = os.path.relpath(path, steam.root)
+        (file or sys.stdout).writelines(difflib.unified_diff(
+            old.decode('utf-8').splitlines(True),
+            new.decode('utf-8').splitlines(True),
+            'a/' + name, 'b/' + name))
+
+
+def _add_member(tar, username, snapshot, mtime):
+    data = json.dumps(snapshot, sort_keys=True, indent=1).encode('utf-8')
+    info = tarfile.TarInfo(PREFIX + quote(username, safe='') + '.json')
+    info.size = len(data)
+    info.mtime = mtime
+    info.mode = 0o600
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _apply(steam, snapshot):
+    username = snapshot['loginusers']['AccountName']
+    steam.apply_snapshot(username, snapshot)
+    return username
+
+
+def _is_snapshot(snapshot):
+    return (
+        isinstance(snapshot, dict) and
+        isinstance(snapshot.get('steam_id'), str) and
+        isinstance(snapshot.get('loginusers'), dict) and
+        isinstance(snapshot['loginusers'].get('AccountName'), str) and
+        isinstance(snapshot.get('account'), (dict, type(None))) and
+        isinstance(snapshot.get('connect_cache'), dict))
@@ -1,14 +1,54 @@
-from PyQt5.QtCore import QThread
+from .profiling import profiled
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import os
 
 
 class AsyncTask(QThread):
 
-    """Read a file asynchronously. Emit signal whenever a new line becomes
-    available."""
+    """Execute a function in a background thread. The return value is
+    available as ``result`` after the ``finished`` signal was emitted."""
 
     def __init__(self, func):
         super().__init__()
         self.func = func
+        self.result = None
 
     def run(self):
-        self.func()
+        self.result = profiled(self.func)()
+
+
+class FileReaderThread(QThread):
+
+    """Read a file asynchronously. Emit signal whenever a new line becomes
+    available."""
+
+    line_received = pyqtSignal(str)
+
+    def __init__(self, fd):
+        super().__init__()
+        self._fd = fd
+        self._exit = False
+
+    def run(self):
+        # `dup()`-ing the file descriptor serves two purposes here:
+        # - leave the `self._fd` open when `f` reaches its end of life
+        # - allow writing to `self._fd` without blocking from the main thread
+        with os.fdopen(os.dup(self._fd)) as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if line:
+                    self.line_received.emit(line)
+                elif self._exit:
+                    return
+
+    def stop(self):
+        self._exit = True
+        # We have to wake up the reader thread by sending an empty line. I
+        # first tried to close the file directly, but it turns out this blocks
+        # the main thread and does not wake up the reader thread. Note that
+        # this operation would block if we hadn't dup()-ed the file descriptor
+        # for the reader thread:
+        os.write(self._fd, b"\n")
+        self.wait()
@@ -0,0 +1,138 @@
+"""
+Shell completion helper.
+
+Usage:
+    steam-acolyte-complete CWORD WORDS...
+
+Prints completion candidates for ``WORDS[CWORD]``, one per line, where
+``WORDS`` is the full command line starting with ``steam-acolyte``.
+
+This runs on every TAB press, so it must be fast: it only reads the account
+name index that acolyte maintains in its data folder, and must not import Qt
+or anything else that is expensive (including the rest of steam_acolyte).
+"""
+
+import os
+import sys
+
+
+COMMANDS = [
+    'store', 'switch', 'start', 'remove', 'list', 'status', 'current',
+    'stats', 'sandbox', 'usage', 'undo', 'history', 'daemon',
+    'sync', 'export', 'import',
+]
+
+# Commands whose positional arguments are account names. The value says
+# whether they accept multiple accounts:
+USER_COMMANDS = {
+    'switch': False,
+    'start': False,
+    'remove': True,
+    'sandbox': True,
+    'daemon': False,
+}
+
+# Options that take an argument, only needed to parse the command line:
+ARG_OPTIONS = {
+    '-p': '--prefix', '--prefix': '--prefix',
+    '-r': '--root', '--root': '--root',
+    '-e': '--exe', '--exe': '--exe',
+    '-l': '--logfile', '--logfile': '--logfile',
+    '-a': '--app', '--app': '--app',
+    '--logsize': '--logsize', '--logkeep': '--logkeep',
+    '--prefetch': '--prefetch', '--profile': '--profile',
+    '--memprofile': '--memprofile',
+    '--hook-timeout': '--hook-timeout', '--hook-budget': '--hook-budget',
+}
+
+NAMES_FILE = os.path.join('acolyte', 'accounts.txt')
+
+
+def main(args=None):
+    args = sys.argv[1:] if args is None else args
+    try:
+        cword = int(args[0])
+    except (IndexError, ValueError):
+        print(__doc__.strip(), file=sys.stderr)
+        return 1
+    words = args[1:]
+    current = words[cword] if cword < len(words) else ''
+    for candidate in complete(words[1:cword], current):
+        print(candidate)
+    return 0
+
+
+def complete(words, current):
+    """Return candidates for ``current`` given the preceding ``words`` (not
+    including the program name)."""
+    opts, positional = parse_words(words)
+    if opts is None or current.startswith('-'):
+        return []
+    if not positional:
+        return [c for c in COMMANDS if c.startswith(current)]
+    command = positional[0]
+    if command not in USER_COMMANDS:
+        return []
+    if len(positional) > 1 and not USER_COMMANDS[command]:
+        return []
+    current = current.lower()
+    given = positional[1:]
+    return [name for name in read_names(opts)
+            if name.lower().startswith(current) and name not in given]
+
+
+def parse_words(words):
+    """Split words into options that take arguments and positionals. Returns
+    ``None`` as options if the last word expects an option argument."""
+    opts = {}
+    positional = []
+    words = iter(words)
+    for word in words:
+        name, eq, value = word.partition('=')
+        if name in ARG_OPTIONS:
+            if not eq:
+                value = next(words, None)
+                if value is None:
+                    return None, positional
+            opts[ARG_OPTIONS[name]] = value
+        elif not word.startswith('-'):
+            positional.append(word)
+    return opts, positional
+
+
+def read_names(opts):
+    """Read account names from the index in acolyte's data folder."""
+    for root in find_roots(opts):
+        try:
+            with open(os.path.join(root, NAMES_FILE), encoding='utf-8') as f:
+                return f.read().split()
+        except OSError:
+            continue
+    return []
+
+
+def find_roots(opts):
+    """Return candidates for steam's config root, without doing the full
+    discovery that the main program does."""
+    if opts.get('--root'):
+        return [os.path.expanduser(opts['--root'])]
+    if sys.platform == 'win32':
+        prefix = opts.get('--prefix') or _steam_path()
+        return [prefix] if prefix else []
+    if opts.get('--prefix'):
+        return [os.path.join(os.path.expanduser(opts['--prefix']), 'steam')]
+    from steam_acolyte.locations import CONFIGS
+    return [os.path.expanduser(cfg['root']) for cfg in CONFIGS.values()]
+
+
+def _steam_path():
+    import winreg as reg
+    try:
+        with reg.OpenKey(reg.HKEY_CURRENT_USER, r"SOFTWARE\Valve\Steam") as k:
+            return reg.QueryValueEx(k, "SteamPath")[0]
+    except OSError:
+        return None
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,412 @@
+"""
+Access to steam's config files.
+
+This module must not depend on Qt, so that it can be used by lightweight
+command line queries.
+"""
+
+from .util import (
+    read_file, subkey_lookup, Tracer,
+)
+from .vault import Vault, connect_cache_key
+from .history import SessionJournal
+from .apps import AppIndex
+from .hooks import Hooks
+from .editlog import EditLog
+from . import userdata
+from . import accounts
+from . import prefetch
+from . import vdfedit
+
+import vdf
+
+import os
+import sys
+from abc import abstractmethod
+
+if sys.platform == 'win32':
+    from .steam_win32 import SteamWin32 as SteamImpl
+else:
+    from .steam_linux import SteamLinux as SteamImpl
+
+
+trace = Tracer(__name__)
+
+ACCOUNTS_KEY = r'InstallConfigStore\Software\Valve\Steam\Accounts'
+CONNECT_CACHE_KEY = r'InstallConfigStore\Software\Valve\Steam\ConnectCache'
+
+
+class SteamUser:
+
+    __slots__ = ('steam_id', 'account_name', 'persona_name', 'timestamp')
+
+    def __init__(self, steam_id, account_name, persona_name, timestamp):
+        self.steam_id = steam_id
+        self.account_name = account_name
+        self.persona_name = persona_name
+        self.timestamp = timestamp
+
+    @property
+    def sort_key(self):
+        return accounts.sort_key(self.persona_name, self.account_name)
+
+
+class SteamBase:
+
+    """This defines the methods that need to be provided by the platform
+    specific implementations (SteamLinux/SteamWin32)."""
+
+    # Paths that must be set by __init__:
+    prefix: str
+    root: str
+    exe: str
+    steam_config: str
+    acolyte_data: str
+
+    @abstractmethod
+    def __init__(self, prefix=None, root=None, exe=None):
+        """Locate and set paths of steam installation and acolyte data."""
+        super().__init__()
+
+    @abstractmethod
+    def get_last_user(self):
+        """Return username which was last logged on."""
+
+    @abstractmethod
+    def set_last_user(self, username):
+        """Tell steam to login given user at next start."""
+
+    # IPC:
+
+    @abstractmethod
+    def _is_steam_pid_valid(self):
+        """Check if the saved steam PID file belongs to a running process."""
+
+    @abstractmethod
+    def _read_steam_pid(self):
+        """Return the saved steam PID, or a false value."""
+
+    @abstractmethod
+    def _is_steam_listening(self) -> bool:
+        """Check if another process holds steam's single instance lock, i.e.
+        listens for command lines of new steam processes."""
+
+    @abstractmethod
+    def _set_steam_pid(self):
+        """Save current process ID as the last steam PID."""
+
+    @abstractmethod
+    def _unset_steam_pid(self):
+        """Remove current process ID as the last steam PID."""
+
+    @abstractmethod
+    def _connect(self) -> bool:
+        """Connect to an already running steam instance. Returns true if
+        successful. Called after ``_is_steam_pid_valid()`` returned true."""
+
+    def _pipe_held_by(self, holders):
+        """Called by ``wait_for_steam_exit()`` when steam has exited, but
+        other processes (usually games) keep the IPC channel open. Receives a
+        list of ``procfs.Holder``."""
+
+    def _write_config_file(self, filename, data):
+        """Replace the contents of one of steam's config files with the
+        given bytes. Overridden to record the edit in the journal."""
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+    @abstractmethod
+    def _disconnect(self):
+        """Close a connection established by ``_connect()``, without
+        releasing any locks."""
+
+    @abstractmethod
+    def _listen(self):
+        """Start listening to messages from other steam processes that want to
+        communicate their command line to us."""
+
+    @abstractmethod
+    def _send(self, args: list):
+        """Send command line to connected steam instance. Only valid if
+        previously ``_connect()``-ed."""
+
+    @abstractmethod
+    def unlock(self):
+        """Close connection to other steam instance, or stop listening."""
+
+    @abstractmethod
+    def ensure_single_acolyte_instance(self):
+        """Ensure that we are the only acolyte instance."""
+
+    @abstractmethod
+    def release_acolyte_instance_lock(self):
+        """Allow other acolyte instances to run again."""
+
+    @abstractmethod
+    def wait_for_steam_exit(self):
+        """Wait until steam is closed."""
+
+
+class SteamConfig(SteamImpl, SteamBase):
+
+    """Operations on steam's config files. Note that many of the modifying
+    methods are only safe to use while steam is not running."""
+
+    def __init__(self, prefix=None, root=None, exe=None):
+        super().__init__(prefix, root, exe)
+        self._snapshot = None
+        self._index = (None, None)
+        self.vault = Vault(os.path.join(self.acolyte_data, 'vault'))
+        self.journal = SessionJournal(
+            os.path.join(self.acolyte_data, 'sessions.log'))
+        self.app_index = AppIndex(
+            self.root, os.path.join(self.acolyte_data, 'apps.json'))
+        self.disk_usage = userdata.DiskUsage(
+            self.root, os.path.join(self.acolyte_data, 'userdata.json'))
+        self.trash = os.path.join(self.acolyte_data, 'trash')
+        self.edits = EditLog(os.path.join(self.acolyte_data, 'edits.log'))
+        self.hooks = Hooks(os.path.join(self.acolyte_data, 'hooks'), {
+            'STEAM_PREFIX': self.prefix,
+            'STEAM_ROOT': self.root,
+        })
+
+    def users(self, update=True):
+        """Return an ``AccountIndex`` of all users. The config is parsed only
+        if it has changed since the last call. Unless ``update`` is false,
+        the account snapshot in acolyte's data folder is updated as well."""
+        stamp = self._loginusers_stamp()
+        cached_stamp, index = self._index
+        if index is not None and stamp == cached_stamp:
+            return index
+        index = accounts.AccountIndex(
+            _parse_users(self.read_config('loginusers.vdf')))
+        self._index = (stamp, index)
+        if update:
+            self.update_snapshot(index)
+        return index
+
+    def cached_users(self):
+        """Return an ``AccountIndex`` from the last account snapshot, or
+        ``None`` if there is no snapshot yet. This is much faster than
+        ``users()`` because it does not parse steam's config."""
+        records = accounts.load_snapshot(self._snapshot_file())
+        return records and accounts.AccountIndex(
+            [SteamUser(*record) for record in records], presorted=True)
+
+    def _loginusers_stamp(self):
+        try:
+            st = os.stat(os.path.join(self.steam_config, 'loginusers.vdf'))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def update_snapshot(self, users):
+        """Save account snapshot, if it differs from the last known state."""
+        if self._snapshot is None:
+            self._snapshot = read_file(self._snapshot_file())
+        text = accounts.dump_snapshot(users)
+        names_file = os.path.join(self.acolyte_data, accounts.NAMES_FILE)
+        if text != self._snapshot or not os.path.exists(names_file):
+            accounts.save_snapshot(self._snapshot_file(), text)
+            accounts.save_snapshot(names_file, accounts.dump_names(users))
+            self._snapshot = text
+
+    def _snapshot_file(self):
+        return os.path.join(self.acolyte_data, accounts.SNAPSHOT_FILE)
+
+    @trace.method
+    def remove_user(self, username):
+        """Delete login token and remove account from the list of saved
+        accounts."""
+        self.remove_users([username])
+
+    @trace.method
+    def remove_users(self, usernames, forget=True, purge=False):
+        """Delete login tokens and remove multiple accounts from the list of
+        saved accounts. Each config file is read and written at most once.
+        If ``forget`` is false, the accounts are kept in the vault. If
+        ``purge`` is true, their userdata folders are moved to the trash,
+        see ``purge_trash()``."""
+        remove = {name.lower() for name in usernames}
+        if not remove:
+            return
+        with self.edits.transaction('remove ' + ', '.join(usernames)):
+            index = self._remove_entries(remove, purge)
+        self._index = (self._loginusers_stamp(), index)
+        self.update_snapshot(index)
+        if forget:
+            for name in usernames:
+                self.vault.remove(name)
+
+    def _remove_entries(self, remove, purge):
+        """Remove accounts from steam's config files. Returns the new
+        ``AccountIndex``."""
+        # The cached index can only be reused if it is up to date:
+        cached_stamp, index = self._index
+        if (cached_stamp != self._loginusers_stamp() or
+                self.edits.modified(
+                    os.path.join(self.steam_config, 'loginusers.vdf'))):
+            index = None
+        loginusers = self.read_config('loginusers.vdf')
+        users = subkey_lookup(loginusers, r'users')
+        loginusers['users'] = {
+            uid: info
+            for uid, info in users.items()
+            if info['AccountName'].lower() not in remove
+        }
+        if purge and userdata.move_to_trash(self.root, self.trash, [
+                uid for uid in users if uid not in loginusers['users']]):
+            self.edits.warn("userdata was purged and is not restored")
+        if len(loginusers['users']) != len(users):
+            self.write_config('loginusers.vdf', loginusers)
+
+        config = self.read_config('config.vdf')
+        entries = subkey_lookup(config, ACCOUNTS_KEY)
+        removed = [name for name in entries if name.lower() in remove]
+        for name in removed:
+            del entries[name]
+        if removed:
+            self.write_config('config.vdf', config)
+
+        if index is None:
+            return accounts.AccountIndex(_parse_users(loginusers))
+        return index.without(remove)
+
+    def purge_trash(self, progress=None):
+        """Delete the userdata of removed accounts in a low priority
+        background thread. Returns the ``userdata.Purger``, or ``None`` if
+        there is nothing to delete."""
+        if not os.path.isdir(self.trash):
+            return None
+        return userdata.Purger(self.trash, progress).start()
+
+    @trace.method
+    def store_users(self):
+        """Save the login information of all users to the vault, so it can be
+        restored if steam forgets it."""
+        for username, snapshot in self.snapshots():
+            self.vault.store(username, snapshot)
+        self.vault.prune()
+
+    def snapshots(self):
+        """Iterate over ``(username, snapshot)`` of all users in steam's
+        config, with snapshots in the format of the vault."""
+        loginusers = subkey_lookup(
+            self.read_config('loginusers.vdf'), r'users')
+        config = self.read_config('config.vdf')
+        accounts = {k.lower(): v for k, v in
+                    subkey_lookup(config, ACCOUNTS_KEY).items()}
+        connect_cache = subkey_lookup(config, CONNECT_CACHE_KEY)
+        for uid, info in loginusers.items():
+            username = info['AccountName']
+            token_key = connect_cache_key(username)
+            yield username, {
+                'steam_id': uid,
+                'loginusers': info,
+                'account': accounts.get(username.lower()),
+                'connect_cache': {
+                    k: v for k, v in connect_cache.items()
+                    if k == token_key
+                },
+            }
+
+    @trace.method
+    def restore_user(self, username):
+        """Restore the user's login information from the vault, if it is
+        missing in steam's config. Only the affected entries are modified."""
+        snapshot = self.vault.load(username)
+        if not snapshot:
+            return False
+        with self.edits.transaction('restore ' + username):
+            self.apply_snapshot(username, snapshot, replace=False)
+        return True
+
+    def apply_snapshot(self, username, snapshot, replace=True):
+        """Write the entries of a vault snapshot to steam's config. Existing
+        entries are only overwritten if ``replace`` is true."""
+        self._restore_entries('loginusers.vdf', [
+            (r'users', snapshot['steam_id'], snapshot['loginusers']),
+        ], replace)
+        self._restore_entries('config.vdf', [
+            (ACCOUNTS_KEY, username, snapshot['account']),
+        ] + [
+            (CONNECT_CACHE_KEY, key, token)
+            for key, token in snapshot['connect_cache'].items()
+        ], replace)
+
+    def _restore_entries(self, filename, entries, replace=False):
+        """Insert entries ``(path, key, value)`` that are missing in the given
+        config file (or replace those that differ if ``replace`` is true),
+        and write back the modified part of the file."""
+        conf = os.path.join(self.steam_config, filename)
+        data = self.edits.read(conf)
+        modified = False
+        for path, key, value in entries:
+            if value is None:
+                continue
+            old = vdfedit.lookup(data, path + '\\' + key)
+            if old and (not replace or
+                        vdfedit.parse_value(data, old) == value):
+                continue
+            data, _ = vdfedit.set_entry(data, path, key, value)
+            modified = True
+        if modified:
+            self._write_config_file(conf, data)
+
+    @trace.method
+    def status(self):
+        """Return dict describing whether steam is currently running."""
+        pid = self._read_steam_pid()
+        listening = self._is_steam_listening()
+        pid_valid = bool(pid and self._is_steam_pid_valid())
+        return {
+            'running': listening or pid_valid,
+            'pipe': listening,
+            'pid': pid or None,
+            'pid_valid': pid_valid,
+        }
+
+    def installed_apps(self):
+        """Return list of installed ``apps.App``, sorted by name."""
+        return self.app_index.apps()
+
+    @trace.method
+    def prefetch(self, budget_mib):
+        """Start warming the page cache with steam's program files in the
+        background. Returns a ``Prefetcher`` or ``None``."""
+        return prefetch.prefetch([self.root, self.prefix], budget_mib)
+
+    @trace.method
+    def switch_user(self, username):
+        """Switch login config to given user. Do not use this while steam is
+        running."""
+        with self.edits.transaction('switch to {}'.format(username)):
+            if username:
+                self.restore_user(username)
+            self.set_last_user(username)
+        return True
+
+    @trace.method
+    def read_config(self, filename):
+        """Read a steam .vdf config file."""
+        conf = os.path.join(self.steam_config, filename)
+        text = self.edits.read(conf).decode('utf-8')
+        return vdf.loads(text) if text else {}
+
+    @trace.method
+    def write_config(self, filename, data):
+        """Write a steam .vdf config file."""
+        conf = os.path.join(self.steam_config, filename)
+        text = vdf.dumps(data, pretty=True)
+        self._write_config_file(conf, text.encode('utf-8'))
+
+    def _write_config_file(self, filename, data):
+        self.edits.write(filename, data)
+
+
+def _parse_users(loginusers):
+    """Return list of ``SteamUser`` from parsed ``loginusers.vdf``."""
+    return [
+        SteamUser(uid, u['AccountName'], u['PersonaName'], u['Timestamp'])
+        for uid, u in subkey_lookup(loginusers, r'users').items()
+    ]
@@ -0,0 +1,207 @@
+"""
+Headless supervisor for machines without a tray, e.g. kiosks.
+
+The daemon holds the acolyte instance lock, keeps steam running, and
+restarts it whenever it exits. Requests to login another user are read from
+the control FIFO ``acolyte/control`` in the steam config root, one per line:
+
+- ``switch USER``: exit steam, and restart it as the given user
+- ``quit``: exit steam and the daemon
+
+Only QtCore is used, and everything is driven by events rather than timers:
+steam's exit is signaled by QProcess, the FIFO and signals are watched with
+QSocketNotifiers. In passive mode, where steam's output is not read by
+acolyte (see ``Steam.scan_output``), the daemon does not wake up at all
+while steam runs, except if steam was already running when the daemon was
+started, or if a game outlives steam, where we have to fall back to the
+polling in ``wait_for_steam_exit()``. Otherwise, it wakes up whenever steam
+writes output.
+
+The control FIFO is only available on posix.
+"""
+
+from .async_ import AsyncTask
+from .util import Tracer
+
+from PyQt5.QtCore import QCoreApplication, QObject, QSocketNotifier, QTimer
+
+import logging
+import os
+import signal
+import socket
+import stat
+from time import time
+
+
+trace = Tracer(__name__)
+
+# Delay the restart of steam if it exits quicker than this, to avoid a busy
+# loop if it fails to start:
+MIN_SESSION = 10                # s
+RESTART_DELAY = 5000            # ms
+
+
+class Daemon(QObject):
+
+    def __init__(self, steam, user=None):
+        super().__init__()
+        self.steam = steam
+        self.fifo = os.path.join(steam.acolyte_data, 'control')
+        self.process = None
+        self.wait_task = None
+        self.hooks_task = None
+        self._switch_to = user
+        self._exit = False
+        self._started = None
+        self._notifiers = []
+        self._sockets = None
+
+    def start(self, locked):
+        """Start serving. ``locked`` says whether we have the steam lock."""
+        if os.name == 'posix':
+            self._watch(self._open_fifo(), self._read_control)
+        if locked:
+            self.launch()
+        else:
+            self.wait_for_lock()
+
+    @trace.method
+    def launch(self):
+        """Start steam, as the requested user if any."""
+        if self._exit:
+            QCoreApplication.quit()
+            return
+        user = self._switch_to or self.steam.get_last_user()
+        if self._switch_to:
+            self.steam.switch_user(self._switch_to)
+            self._switch_to = None
+        self.steam.hooks.start('pre-launch', ACOLYTE_USER=user)
+        # Wait in the background, so we keep serving requests and signals:
+        self.hooks_task = AsyncTask(self.steam.hooks.wait)
+        self.hooks_task.finished.connect(self._launch_steam)
+        self.hooks_task.start()
+
+    @trace.method
+    def _launch_steam(self):
+        self.hooks_task = None
+        if self._exit:
+            QCoreApplication.quit()
+            return
+        if self._switch_to:
+            # Requested while the hooks were running:
+            self.launch()
+            return
+        self.steam.unlock()
+        self._started = time()
+        self.process = self.steam.run()
+        self.process.finished.connect(self._on_finished)
+
+    @trace.method
+    def _on_finished(self, exit_code, *_):
+        self.steam.hooks.start(
+            'post-exit', ACOLYTE_USER=self.steam.get_last_user(),
+            ACOLYTE_EXIT_CODE=exit_code)
+        self.process = None
+        self.wait_for_lock()
+
+    @trace.method
+    def wait_for_lock(self):
+        """Wait for steam and its children to exit in the background."""
+        self.wait_task = AsyncTask(self.steam.wait_for_lock)
+        self.wait_task.finished.connect(self._on_locked)
+        self.wait_task.start()
+
+    @trace.method
+    def _on_locked(self):
+        self.wait_task = None
+        self.steam.store_users()
+        self.steam.journal.flush()
+        if self._exit:
+            QCoreApplication.quit()
+        elif (self._started and time() - self._started < MIN_SESSION and
+                not self._switch_to):
+            logging.getLogger(__name__).warning(
+                "Steam exited after %.1f s, restarting in %d s",
+                time() - self._started, RESTART_DELAY // 1000)
+            self._started = None
+            QTimer.singleShot(RESTART_DELAY, self.launch)
+        else:
+            self.launch()
+
+    @trace.method
+    def request(self, line):
+        """Execute a control command."""
+        command, _, arg = line.strip().partition(' ')
+        if command == 'switch' and arg.strip():
+            self._switch_to = arg.strip()
+        elif command == 'quit':
+            self._exit = True
+        else:
+            logging.getLogger(__name__).warning(
+                "Unknown control command: %r", line)
+            return
+        if not self.steam.has_steam_lock():
+            self.steam.stop()
+        elif self._exit:
+            QCoreApplication.quit()
+
+    def watch_signals(self):
+        """Quit gracefully on SIGINT and SIGTERM. Python signal handlers only
+        run when the interpreter gets control, so signals are forwarded to the
+        event loop through a socket, rather than waking up periodically."""
+        read, write = self._sockets = socket.socketpair()
+        read.setblocking(False)
+        write.setblocking(False)
+        signal.set_wakeup_fd(write.fileno())
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: self.request('quit'))
+        self._watch(read.fileno(), lambda fd: read.recv(64))
+
+    def _watch(self, fd, callback):
+        notifier = QSocketNotifier(fd, QSocketNotifier.Read, self)
+        notifier.activated.connect(lambda _: callback(fd))
+        self._notifiers.append(notifier)
+
+    def _open_fifo(self):
+        try:
+            if not stat.S_ISFIFO(os.stat(self.fifo).st_mode):
+                os.remove(self.fifo)
+                os.mkfifo(self.fifo, 0o600)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(self.fifo), exist_ok=True)
+            os.mkfifo(self.fifo, 0o600)
+        # Open for writing as well, so that we never see EOF when a client
+        # closes its end, which would wake us up continuously:
+        return os.open(self.fifo, os.O_RDWR | os.O_NONBLOCK)
+
+    def _read_control(self, fd):
+        try:
+            data = os.read(fd, 4096)
+        except BlockingIOError:
+            return
+        for line in data.decode('utf-8', 'replace').splitlines():
+            if line.strip():
+                self.request(line)
+
+
+def run_daemon(steam, user=None):
+    """Run the daemon until it is told to quit."""
+    app = QCoreApplication([])
+    first, locked = steam.lock(['-foreground'])
+    if not first:
+        print("Acolyte is already running. Terminating.")
+        return 0
+    if locked:
+        steam.edits.recover()
+    daemon = Daemon(steam, user)
+    daemon.watch_signals()
+    try:
+        daemon.start(locked)
+        return app.exec_()
+    finally:
+        steam.hooks.shutdown()
+        if daemon.hooks_task is not None:
+            daemon.hooks_task.wait()
+        steam.unlock()
+        steam.release_acolyte_instance_lock()
+        steam.journal.flush()
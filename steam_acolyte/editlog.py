@@ -0,0 +1,372 @@
+"""
+Write-ahead journal of the edits of steam's config files.
+
+All modifications of steam's config files go through transactions. When a
+transaction ends, each modified file is compared to its new contents, and
+only the tail starting at the first changed byte is rewritten. Before any
+file is touched, one record per transaction is appended to the journal and
+synced to disk. It contains the pre-image of each rewritten tail, i.e. the
+original bytes from the offset of the first change to the end of the file,
+along with the size and hash of the new tail. After all files have been
+written, a commit record is appended. It is not synced, so that there is
+only one sync of the journal per transaction: if the commit record is lost
+by a power failure, the transaction is rolled back on the next start.
+
+If acolyte crashes while writing, the journal ends with a transaction that
+was not committed. Its pre-images are written back by ``recover()``, which
+only needs to look at the last records of the journal. The record also
+contains the hash of the unchanged head of each file, so that files which
+have been rewritten by steam in the meantime are left alone.
+
+The pre-images also allow to undo committed transactions, as long as the
+affected files have not been modified by steam since. Undoing a transaction
+is itself a transaction that is recorded in the journal. Side effects
+outside of the config files (e.g. purged userdata) are not undone, but can
+be noted in the record with ``warn()``.
+
+The journal consists of JSON lines ``{"t": "begin", "seq": SEQ, "time":
+TIME, "desc": DESCRIPTION, "edits": [{"f": FILE, "o": OFFSET, "pre":
+BASE64, "n": NEW_SIZE, "h": NEW_TAIL_SHA1, "ph": HEAD_SHA1}, ...]}``,
+optionally with ``"undo": SEQ`` and ``"warn": [TEXT, ...]``, followed by
+``{"t": "commit", "seq": SEQ}`` or ``{"t": "abort", "seq": SEQ}``. When it
+grows too large, the oldest transactions are dropped until it has shrunk to
+half of that size.
+
+Note that on windows, the last user is stored in the registry, which is not
+covered by the journal.
+
+This module must not import Qt.
+"""
+
+from .util import read_binary, patch_file, write_file_atomic
+
+from base64 import b64encode, b64decode
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import logging
+from time import time
+
+
+COMPACT_SIZE = 1024 * 1024  # compact when the journal exceeds this size
+BLOCK_SIZE = 8192           # for reading the journal backwards
+
+
+class EditLog:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._pending = None        # {filename: data} of open transaction
+        self._warnings = []         # of open transaction
+        self._last_seq = None       # known after recover()
+
+    @contextmanager
+    def transaction(self, description='', undo=None):
+        """Collect all ``write()`` calls within the context, and apply them
+        together when it is left without exception. Nested transactions are
+        merged into the outermost one. Within the transaction, ``read()``
+        returns the new contents of files that have been written."""
+        if self._pending is not None:
+            yield
+            return
+        self._pending = {}
+        self._warnings = []
+        try:
+            yield
+            pending = self._pending
+        finally:
+            self._pending = None
+        self._apply(pending, description, undo, self._warnings)
+
+    @contextmanager
+    def dry_run(self):
+        """Like ``transaction()``, but discard all writes instead of applying
+        them. Yields the dict ``{filename: data}`` of the writes, which is
+        filled in as the context executes."""
+        if self._pending is not None:
+            raise RuntimeError("Can't start a dry run within a transaction.")
+        self._pending = pending = {}
+        try:
+            yield pending
+        finally:
+            self._pending = None
+
+    def warn(self, text):
+        """Note a side effect of the current transaction that can't be
+        undone. Notes are shown when the transaction is undone."""
+        if self._pending is not None:
+            self._warnings.append(text)
+
+    def read(self, filename):
+        """Return the contents of the given file as bytes, including pending
+        writes of the current transaction."""
+        if self._pending and filename in self._pending:
+            return self._pending[filename]
+        return read_binary(filename)
+
+    def modified(self, filename):
+        """Check whether the file has pending writes in the current
+        transaction."""
+        return bool(self._pending) and filename in self._pending
+
+    def write(self, filename, data):
+        """Replace the contents of the given file with ``data`` (bytes)."""
+        if self._pending is None:
+            self._apply({filename: data}, '')
+        else:
+            self._pending[filename] = data
+
+    def recover(self):
+        """Roll back a transaction that was interrupted by a crash. Only the
+        end of the journal is read."""
+        if self._last_seq is not None:
+            return
+        self._last_seq = 0
+        try:
+            f = open(self.filename, 'r+b')
+        except FileNotFoundError:
+            return
+        with f:
+            # Cut off a record that was torn by a crash, so that the next
+            # record starts on a new line:
+            _truncate_torn(f)
+            last = None
+            for line in _reversed_lines(f):
+                last = _parse(line)
+                if last is not None:
+                    break
+        if last is None:
+            return
+        self._last_seq = last['seq']
+        if last['t'] == 'begin':
+            for edit in reversed(last['edits']):
+                data = read_binary(edit['f'])
+                pre = b64decode(edit['pre'])
+                if data[edit['o']:] == pre:
+                    continue
+                if not _same_head(edit, data):
+                    logging.getLogger(__name__).warning(
+                        "Not rolling back %s: it has been rewritten since",
+                        edit['f'])
+                    continue
+                patch_file(edit['f'], data[:edit['o']] + pre, edit['o'])
+            self._append({'t': 'abort', 'seq': last['seq']})
+
+    def undo(self):
+        """Revert the most recent transaction that has not been undone yet.
+        Returns its record, or ``None`` if there is nothing to undo. Raises
+        ``RuntimeError`` if an affected file was modified since."""
+        self.recover()
+        target = self._undo_target()
+        if target is None:
+            return None
+        pending = {}
+        for edit in target['edits']:
+            data = read_binary(edit['f'])
+            if (len(data) != edit['n'] or not _same_head(edit, data) or
+                    _digest(data[edit['o']:]) != edit['h']):
+                raise RuntimeError(
+                    "Can't undo {!r}: {} has been modified since.".format(
+                        target['desc'], edit['f']))
+            pending[edit['f']] = data[:edit['o']] + b64decode(edit['pre'])
+        self._apply(pending, 'undo: ' + target['desc'], target['seq'])
+        return target
+
+    def history(self):
+        """Return list of all transactions in the journal, oldest first, as
+        dicts with keys ``seq``, ``time``, ``desc``, ``files``, ``status``,
+        ``undo`` and ``warn``."""
+        entries = {}
+        try:
+            with open(self.filename, 'rb') as f:
+                for line in f:
+                    record = _parse(line)
+                    if record is None:
+                        continue
+                    if record['t'] == 'begin':
+                        entries[record['seq']] = {
+                            'seq': record['seq'],
+                            'time': record['time'],
+                            'desc': record['desc'],
+                            'files': [e['f'] for e in record['edits']],
+                            'status': 'pending',
+                            'undo': record.get('undo'),
+                            'warn': record.get('warn', []),
+                        }
+                    elif record['seq'] in entries:
+                        entries[record['seq']]['status'] = (
+                            'committed' if record['t'] == 'commit'
+                            else 'aborted')
+        except FileNotFoundError:
+            pass
+        for entry in entries.values():
+            undone = entries.get(entry['undo'])
+            if undone and entry['status'] == 'committed':
+                undone['status'] = 'undone'
+        return sorted(entries.values(), key=lambda e: e['seq'])
+
+    def _apply(self, pending, description, undo=None, warnings=()):
+        self.recover()
+        edits = []
+        for filename, data in pending.items():
+            old = read_binary(filename)
+            offset = _common_prefix(old, data)
+            if offset < max(len(old), len(data)):
+                edits.append((filename, offset, old[offset:], data))
+        if not edits:
+            return
+        seq = self._last_seq + 1
+        record = {
+            't': 'begin',
+            'seq': seq,
+            'time': time(),
+            'desc': description,
+            'edits': [{
+                'f': filename,
+                'o': offset,
+                'pre': b64encode(pre).decode('ascii'),
+                'n': len(data),
+                'h': _digest(data[offset:]),
+                'ph': _digest(memoryview(data)[:offset]),
+            } for filename, offset, pre, data in edits],
+        }
+        if undo is not None:
+            record['undo'] = undo
+        if warnings:
+            record['warn'] = list(warnings)
+        self._append(record)
+        try:
+            for filename, offset, _, data in edits:
+                patch_file(filename, data, offset)
+        except BaseException:
+            # Let the next transaction roll this one back first:
+            self._last_seq = None
+            raise
+        self._append({'t': 'commit', 'seq': seq}, sync=False)
+        self._last_seq = seq
+        if os.path.getsize(self.filename) > COMPACT_SIZE:
+            self._compact()
+
+    def _undo_target(self):
+        """Find the last committed transaction that has not been undone, and
+        is not an undo itself."""
+        committed = set()
+        undone = set()
+        try:
+            f = open(self.filename, 'rb')
+        except FileNotFoundError:
+            return None
+        with f:
+            for line in _reversed_lines(f):
+                record = _parse(line)
+                if record is None:
+                    continue
+                seq = record['seq']
+                if record['t'] == 'commit':
+                    committed.add(seq)
+                elif record['t'] != 'begin' or seq not in committed:
+                    continue
+                elif 'undo' in record:
+                    undone.add(record['undo'])
+                elif seq not in undone:
+                    return record
+        return None
+
+    def _append(self, record, sync=True):
+        """Append a record to the journal, and sync it to disk."""
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        with open(self.filename, 'ab') as f:
+            f.write(_dump(record))
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _compact(self):
+        """Drop the oldest transactions, until the journal is at most half
+        of ``COMPACT_SIZE`` large. The last transaction is always kept."""
+        with open(self.filename, 'rb') as f:
+            lines = [((_parse(line) or {'seq': 0})['seq'], line)
+                     for line in f]
+        size = sum(len(line) for _, line in lines)
+        drop = 0
+        for seq, line in lines:
+            if size <= COMPACT_SIZE // 2:
+                break
+            size -= len(line)
+            drop = max(drop, seq)
+        drop = min(drop, self._last_seq - 1)
+        write_file_atomic(self.filename, b''.join(
+            line for seq, line in lines if seq > drop).decode('utf-8'))
+
+
+def _dump(record):
+    return json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def _parse(line):
+    """Parse a journal line. Returns ``None`` for a damaged line."""
+    try:
+        record = json.loads(line.decode('utf-8'))
+    except ValueError:
+        return None
+    if isinstance(record, dict) and 't' in record and 'seq' in record:
+        return record
+    return None
+
+
+def _digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def _same_head(edit, data):
+    """Check whether the file still has the head that the edit left
+    unchanged. Journals of older versions lack the hash of the head."""
+    if len(data) < edit['o']:
+        return False
+    return 'ph' not in edit or (
+        _digest(memoryview(data)[:edit['o']]) == edit['ph'])
+
+
+def _common_prefix(a, b):
+    """Return the length of the common prefix of two byte strings."""
+    size = min(len(a), len(b))
+    lo, hi = 0, size
+    # Binary search, each step is a single memcmp:
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _reversed_lines(f):
+    """Iterate over the lines of a binary file, starting from its end."""
+    pos = f.seek(0, os.SEEK_END)
+    rest = b''
+    while pos > 0:
+        size = min(BLOCK_SIZE, pos)
+        pos -= size
+        f.seek(pos)
+        lines = (f.read(size) + rest).split(b'\n')
+        rest = lines.pop(0)
+        yield from filter(None, reversed(lines))
+    if rest:
+        yield rest
+
+
+def _truncate_torn(f):
+    """Truncate the file after its last newline."""
+    end = pos = f.seek(0, os.SEEK_END)
+    while pos > 0:
+        size = min(BLOCK_SIZE, pos)
+        pos -= size
+        f.seek(pos)
+        index = f.read(size).rfind(b'\n')
+        if index >= 0:
+            pos += index + 1
+            break
+    if pos != end:
+        f.truncate(pos)
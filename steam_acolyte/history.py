@@ -0,0 +1,186 @@
+"""
+Journal of steam sessions started by acolyte.
+
+Each session is stored as one JSON line ``{"u": ACCOUNT, "s": START, "e":
+END, "x": EXIT_CODE, "m": {MILESTONE: SECONDS}}`` in an append-only file in
+``acolyte_data``, where "m" holds the startup milestones that were detected
+in steam's output. A session is appended in a single write when it ends, so
+that it survives a crash of acolyte and is seen by ``stats`` in other
+processes right away. When the file grows too large, old sessions are
+folded into one summary line per account ``{"u": ACCOUNT, "n": COUNT, "t":
+TOTAL, "f": FAILED, "s": FIRST, "e": LAST, "ln": LOGINS, "lt":
+LOGIN_TIME}``.
+
+Statistics and the most recently used order are computed by streaming over
+the file, so memory use does not depend on the length of the history.
+"""
+
+from .util import write_file_atomic
+
+from collections import deque
+import json
+import os
+
+
+COMPACT_SIZE = 256 * 1024   # compact when the file exceeds this size
+KEEP_SESSIONS = 256         # number of sessions kept as is on compaction
+
+
+class Stats:
+
+    """Aggregated usage statistics of a single account."""
+
+    __slots__ = ('account', 'sessions', 'total', 'failed', 'first', 'last',
+                 'logins', 'login_time')
+
+    def __init__(self, account):
+        self.account = account
+        self.sessions = 0
+        self.total = 0.0
+        self.failed = 0
+        self.first = None
+        self.last = None
+        self.logins = 0             # sessions with a known login time
+        self.login_time = 0.0
+
+    def add(self, record):
+        """Fold a session or summary record into the statistics."""
+        start, end = record['s'], record['e']
+        if 'n' in record:
+            self.sessions += record['n']
+            self.total += record['t']
+            self.failed += record['f']
+            self.logins += record.get('ln', 0)
+            self.login_time += record.get('lt', 0.0)
+        else:
+            self.sessions += 1
+            self.total += max(end - start, 0)
+            self.failed += bool(record['x'])
+            login = record.get('m', {}).get('login')
+            if login is not None:
+                self.logins += 1
+                self.login_time += login
+        self.first = start if self.first is None else min(self.first, start)
+        self.last = end if self.last is None else max(self.last, end)
+
+    def summary(self):
+        """Return summary record equivalent to all folded records."""
+        return {'u': self.account, 'n': self.sessions, 't': self.total,
+                'f': self.failed, 's': self.first, 'e': self.last,
+                'ln': self.logins, 'lt': self.login_time}
+
+    def to_json(self):
+        return {
+            'account': self.account,
+            'sessions': self.sessions,
+            'total_seconds': round(self.total, 3),
+            'failed': self.failed,
+            'first': self.first,
+            'last': self.last,
+            'avg_login_seconds': (
+                round(self.login_time / self.logins, 3)
+                if self.logins else None),
+        }
+
+
+class SessionJournal:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._buffer = []
+        self._last_used = None
+        self.generation = 0         # incremented whenever usage changes
+
+    def record(self, account, start, end, exit_code, milestones=()):
+        """Add a finished session to the journal. ``milestones`` is a list
+        of ``(name, seconds)`` since the start."""
+        if not account:
+            return
+        record = {'u': account, 's': start, 'e': end, 'x': exit_code}
+        if milestones:
+            record['m'] = {name: round(seconds, 3)
+                           for name, seconds in milestones}
+        self._buffer.append(record)
+        self.generation += 1
+        if self._last_used is not None:
+            self._touch(account, end)
+        self.flush()
+
+    def started(self, account, start):
+        """Mark account as used, before the session is finished."""
+        self.generation += 1
+        if account and self._last_used is not None:
+            self._touch(account, start)
+
+    def flush(self):
+        """Write buffered records to disk."""
+        if not self._buffer:
+            return
+        text = ''.join(_dump(record) for record in self._buffer)
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        with open(self.filename, 'a', encoding='utf-8') as f:
+            f.write(text)
+        self._buffer = []
+        if os.path.getsize(self.filename) > COMPACT_SIZE:
+            self.compact()
+
+    def records(self):
+        """Iterate over all records, including buffered ones."""
+        try:
+            with open(self.filename, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:      # e.g. truncated by a crash
+                        continue
+        except FileNotFoundError:
+            pass
+        yield from self._buffer
+
+    def stats(self):
+        """Return dict of ``Stats`` by account name."""
+        stats = {}
+        for record in self.records():
+            account = record['u']
+            if account not in stats:
+                stats[account] = Stats(account)
+            stats[account].add(record)
+        return stats
+
+    def last_used(self, account):
+        """Return the time when the account was last used (or ``None``)."""
+        if self._last_used is None:
+            self._last_used = {}
+            for record in self.records():
+                self._touch(record['u'], record['e'])
+        return self._last_used.get(account.lower())
+
+    def _touch(self, account, when):
+        # Sort keys are kept up to date incrementally on each session,
+        # rather than being recomputed from the file:
+        key = account.lower()
+        self._last_used[key] = max(self._last_used.get(key, when), when)
+
+    def compact(self):
+        """Fold all but the most recent sessions into per-account summary
+        records."""
+        self.flush()
+        keep = deque()
+        stats = {}
+        for record in self.records():
+            keep.append(record)
+            if len(keep) <= KEEP_SESSIONS:
+                continue
+            record = keep.popleft()
+            account = record['u']
+            if account not in stats:
+                stats[account] = Stats(account)
+            stats[account].add(record)
+        text = ''.join(
+            [_dump(s.summary()) for s in stats.values()] +
+            [_dump(record) for record in keep])
+        write_file_atomic(self.filename, text)
+
+
+def _dump(record):
+    return json.dumps(record, separators=(',', ':')) + '\n'
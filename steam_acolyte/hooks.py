@@ -0,0 +1,184 @@
+"""
+Site specific hooks that run around each steam session, e.g. to sync saves,
+mount network libraries or flush metrics.
+
+Executables in ``acolyte_data/hooks/pre-launch/`` are run before steam is
+started, and those in ``acolyte_data/hooks/post-exit/`` after it has exited.
+All hooks run concurrently on a worker pool, and each one is killed when it
+exceeds its timeout. Before a launch, we wait for the pre-launch hooks (and
+post-exit hooks of the previous session that are still running) at most
+for the given budget, so that slow hooks can't delay a login by more than
+that. Hooks that have not even started by then are cancelled, the others
+continue in the background until they finish or time out. When the GUI or
+the daemon exits, running hooks are killed.
+
+Hooks receive information about the session in environment variables:
+
+- ``ACOLYTE_HOOK``: ``pre-launch`` or ``post-exit``
+- ``ACOLYTE_USER``: account name
+- ``ACOLYTE_EXIT_CODE``: steam's exit code (only for post-exit)
+- ``STEAM_PREFIX``, ``STEAM_ROOT``: steam's folders
+
+This module must not import Qt.
+"""
+
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+import logging
+import os
+import signal
+import subprocess
+import threading
+from time import time
+
+
+MAX_WORKERS = 8
+KEEP_RESULTS = 100
+
+# returncode is None if the hook could not be started or timed out:
+HookResult = namedtuple('HookResult', ['name', 'seconds', 'returncode'])
+
+
+class Hooks:
+
+    def __init__(self, folder, env=None, timeout=30, budget=5):
+        self.folder = folder
+        self.env = env or {}
+        self.timeout = timeout      # seconds per hook, 0 means unlimited
+        self.budget = budget        # seconds to wait before a launch
+        self.results = deque(maxlen=KEEP_RESULTS)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._processes = set()
+        self._cancelled = 0         # incremented by cancel()
+
+    def find(self, event):
+        """Return list of executable hooks for the given event."""
+        try:
+            with os.scandir(os.path.join(self.folder, event)) as entries:
+                return sorted(
+                    e.path for e in entries
+                    if not e.name.startswith('.') and
+                    not e.name.endswith('~') and
+                    e.is_file() and os.access(e.path, os.X_OK))
+        except FileNotFoundError:
+            return []
+
+    def start(self, event, **env):
+        """Start all hooks of the given event in the background. Additional
+        environment variables can be passed as keyword arguments."""
+        paths = self.find(event)
+        if not paths:
+            return
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+        environ = dict(os.environ, ACOLYTE_HOOK=event, **self.env)
+        environ.update((k, str(v)) for k, v in env.items() if v is not None)
+        with self._lock:
+            cancelled = self._cancelled
+        futures = [self._pool.submit(self._run, path, environ, cancelled)
+                   for path in paths]
+        with self._lock:
+            self._pending.update(futures)
+        for future in futures:
+            future.add_done_callback(self._done)
+
+    def busy(self):
+        """Check whether any hooks are queued or running."""
+        with self._lock:
+            return bool(self._pending)
+
+    def wait(self, budget=None):
+        """Wait until all hooks have finished, or until ``budget`` seconds
+        (by default ``self.budget``) have passed. Hooks that have not been
+        started by then are cancelled. Returns true if all hooks finished in
+        time."""
+        if budget is None:
+            budget = self.budget
+        with self._lock:
+            pending = list(self._pending)
+        done, not_done = wait(pending, timeout=budget or None)
+        if not_done:
+            for future in not_done:
+                future.cancel()
+            logging.getLogger(__name__).warning(
+                "Not waiting for %d hook(s) that exceed the budget of %.1f s",
+                len(not_done), budget)
+        return not not_done
+
+    def run(self, event, **env):
+        """Start the hooks of the given event, and wait for them within the
+        budget."""
+        self.start(event, **env)
+        return self.wait()
+
+    def cancel(self):
+        """Cancel queued hooks, and kill running ones."""
+        with self._lock:
+            self._cancelled += 1
+            pending = list(self._pending)
+            processes = list(self._processes)
+        for future in pending:
+            future.cancel()
+        for process in processes:
+            _kill(process)
+
+    def shutdown(self):
+        """Cancel all hooks, and stop the worker pool. Must be called before
+        exiting, because the interpreter waits for running workers."""
+        self.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def _run(self, path, environ, cancelled):
+        logger = logging.getLogger(__name__)
+        name = os.path.relpath(path, self.folder)
+        start = time()
+        try:
+            process = subprocess.Popen(
+                [path], env=environ, stdin=subprocess.DEVNULL,
+                start_new_session=(os.name == 'posix'))
+        except OSError as e:
+            logger.warning("Failed to run hook %s: %s", name, e)
+            returncode = None
+        else:
+            with self._lock:
+                self._processes.add(process)
+                # The hook may have been cancelled while it was starting:
+                if self._cancelled != cancelled:
+                    _kill(process)
+            try:
+                returncode = process.wait(self.timeout or None)
+            except subprocess.TimeoutExpired:
+                _kill(process)
+                process.wait()
+                returncode = None
+                logger.warning("Killed hook %s after %.1f s",
+                               name, self.timeout)
+            finally:
+                with self._lock:
+                    self._processes.discard(process)
+        result = HookResult(name, time() - start, returncode)
+        if returncode:
+            logger.warning("Hook %s failed with exit code %d",
+                           name, returncode)
+        logger.info("Hook %s finished after %.2f s", name, result.seconds)
+        self.results.append(result)
+        return result
+
+
+def _kill(process):
+    """Kill the process and, on posix, all processes in its session."""
+    try:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except OSError:
+        pass
@@ -0,0 +1,31 @@
+"""
+Default locations of steam installations on linux.
+
+This module is kept free of imports, so it can be used by the shell
+completion without slowing it down.
+"""
+
+# I tested this script on an ubuntu and archlinux machine, where I found
+# the steam config and program files in different locations. In both cases
+# there was also a path/symlink that pointed to the correct location:
+#
+#             common name           ubuntu            archlinux
+#   config    ~/.steam/steam@   ->  ~/.steam/steam    ~/.local/share/Steam
+#   data      ~/.steam/root@    ->  ~/.steam          ~/.local/share/Steam
+CONFIGS = {
+    'DEFAULT': {
+        'exe': 'steam',
+        'prefix': '~/.steam',
+        'root': '~/.steam/steam',
+    },
+    'NATIVE': {
+        'exe': 'steam-native',
+        'prefix': '~/.steam',
+        'root': '~/.steam/steam',
+    },
+    'FLATPACK': {
+        'exe': 'com.valvesoftware.Steam',
+        'prefix': '~/.var/app/com.valvesoftware.Steam/.steam',
+        'root': '~/.var/app/com.valvesoftware.Steam/steam',
+    },
+}
@@ -0,0 +1,140 @@
+"""
+Size-capped log file for steam's output.
+
+Steam's output is very chatty, so a log file that is only ever appended to
+grows without bounds on machines where steam runs for a long time. Here, the
+log is rotated when it reaches a given size: the current file is renamed
+and compressed to ``LOG.1.gz`` in a background thread, while older segments
+are shifted to ``LOG.2.gz``, etc. Only a given number of them is kept.
+
+Rotated segments are handed to a single compressor thread that is shared by
+all logs, so that rotations never race, not even those of consecutive
+sessions that log to the same file. Handing off never blocks the writer. The
+number of segments that wait for compression is bounded by the number of
+segments to keep: if the compression can't keep up, the oldest waiting
+segment is deleted without compressing it, since it would be dropped by the
+later rotations anyway. Segments whose compression was interrupted by
+exiting are compressed on the next start.
+
+This module must not import Qt.
+"""
+
+import glob
+import gzip
+import logging
+import os
+import shutil
+import threading
+from time import time
+
+
+BUFFER_SIZE = 256 * 1024
+
+_pending = {}               # filename -> segments to compress, oldest first
+_keep = {}                  # filename -> number of segments to keep
+_active = None              # segment that is being compressed
+_lock = threading.Lock()
+_wakeup = threading.Condition(_lock)
+_thread = None
+
+
+class RotatingLog:
+
+    def __init__(self, filename, max_bytes=0, keep=5):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self._file = open(filename, 'ab', buffering=BUFFER_SIZE)
+        self._size = self._file.tell()
+        # Compress segments that were left over by a previous crash:
+        for pending in sorted(glob.glob(glob.escape(filename) + '.*.pending')):
+            self._compress_later(pending)
+
+    def write(self, data):
+        """Append bytes to the log. Rotates the log if it is too large."""
+        self._file.write(data)
+        self._size += len(data)
+        if self.max_bytes and self._size >= self.max_bytes:
+            self.rotate()
+
+    def flush(self):
+        self._file.flush()
+
+    def rotate(self):
+        """Start a new log file, and compress the current one."""
+        self._file.close()
+        stamp = int(time() * 1000)
+        # Several rotations may happen within the same millisecond:
+        while os.path.exists('{}.{}.pending'.format(self.filename, stamp)):
+            stamp += 1
+        pending = '{}.{}.pending'.format(self.filename, stamp)
+        os.replace(self.filename, pending)
+        self._file = open(self.filename, 'ab', buffering=BUFFER_SIZE)
+        self._size = 0
+        self._compress_later(pending)
+
+    def close(self):
+        """Close the log file. Compression of rotated segments continues in
+        the background."""
+        self._file.close()
+
+    def _compress_later(self, pending):
+        global _thread
+        with _lock:
+            waiting = _pending.setdefault(self.filename, [])
+            if pending in waiting or pending == _active:
+                return
+            waiting.append(pending)
+            _keep[self.filename] = self.keep
+            limit = max(self.keep, 1)
+            dropped = waiting[:-limit]
+            del waiting[:-limit]
+            if _thread is None:
+                _thread = threading.Thread(
+                    target=_compress_loop, name='logfile', daemon=True)
+                _thread.start()
+            _wakeup.notify()
+        for segment in dropped:
+            try:
+                os.remove(segment)
+            except OSError as e:
+                logging.getLogger(__name__).warning(
+                    "Failed to remove %s: %s", segment, e)
+
+
+def _compress_loop():
+    global _active
+    while True:
+        with _lock:
+            while not any(_pending.values()):
+                _wakeup.wait()
+            filename = next(f for f, waiting in _pending.items() if waiting)
+            pending = _active = _pending[filename].pop(0)
+            keep = _keep[filename]
+        try:
+            if keep > 0:
+                _shift(filename, keep)
+                target = '{}.1.gz'.format(filename)
+                with open(pending, 'rb') as src:
+                    with gzip.open(target + '.tmp', 'wb') as dst:
+                        shutil.copyfileobj(src, dst, BUFFER_SIZE)
+                os.replace(target + '.tmp', target)
+            os.remove(pending)
+        except OSError as e:
+            logging.getLogger(__name__).warning(
+                "Failed to compress %s: %s", pending, e)
+        finally:
+            with _lock:
+                _active = None
+
+
+def _shift(filename, keep):
+    """Rename ``LOG.N.gz`` to ``LOG.N+1.gz``, and drop the oldest."""
+    name = filename + '.{}.gz'
+    try:
+        os.remove(name.format(keep))
+    except FileNotFoundError:
+        pass
+    for i in range(keep - 1, 0, -1):
+        if os.path.exists(name.format(i)):
+            os.replace(name.format(i), name.format(i + 1))
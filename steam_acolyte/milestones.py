@@ -0,0 +1,75 @@
+"""
+Detect milestones of steam's startup in its output.
+
+What matters for the latency of switching users is the time until steam is
+logged in and shows its UI, not the time until the process starts. This
+module scans steam's output for lines that mark these milestones.
+
+Each chunk of output is searched as is, without joining it with previous
+output. Matches that cross the boundary between two chunks are found by
+additionally searching the last bytes of the previous chunk together with
+the first bytes of the current one. Once all milestones were found, the
+output is not searched anymore.
+
+The patterns are heuristics based on the output of current steam clients,
+and may have to be adapted to future versions.
+
+This module must not import Qt.
+"""
+
+import re
+from time import time
+
+
+# (name, pattern), in the order in which they usually occur:
+MILESTONES = [
+    # Printed by the bootstrapper after steam has started:
+    ('started', rb'Startup - updater built|Running Steam on '),
+    # Printed when the client processes its command line, after it has
+    # created its IPC channel:
+    ('ipc', rb'ExecCommandLine: '),
+    # Printed when logged on to the steam servers:
+    ('login', rb'\[Logged On\]|Logged [Oo]n|BuildCompleteAppOverviewChange'),
+    # Printed when the main window is shown:
+    ('ui', rb'SteamUI|Opening Steam UI|CMainWindow'),
+]
+
+# Maximum length of a match that is guaranteed to be found if it crosses
+# the boundary between two chunks:
+OVERLAP = 256
+
+
+class OutputTap:
+
+    """Scans chunks of output for milestones. Calls ``callback(name,
+    seconds)`` for each milestone when it is found for the first time, with
+    the time since the tap was created."""
+
+    def __init__(self, callback, milestones=MILESTONES):
+        self.callback = callback
+        self.start = time()
+        self.events = []
+        self._pending = [(name, re.compile(pattern))
+                         for name, pattern in milestones]
+        self._tails = {}
+
+    @property
+    def done(self):
+        return not self._pending
+
+    def feed(self, data, channel=0):
+        """Scan the next chunk of output. Chunks of different channels (e.g.
+        stdout and stderr) are treated as separate streams."""
+        if not self._pending or not data:
+            return
+        boundary = self._tails.get(channel, b'') + data[:OVERLAP]
+        self._tails[channel] = data[-OVERLAP:]
+        found = [(name, pattern) for name, pattern in self._pending
+                 if pattern.search(boundary) or pattern.search(data)]
+        if not found:
+            return
+        elapsed = time() - self.start
+        for item in found:
+            self._pending.remove(item)
+            self.events.append((item[0], elapsed))
+            self.callback(item[0], elapsed)
@@ -0,0 +1,126 @@
+"""
+Warm the page cache with steam's program files.
+
+Switching users means a cold start of steam, which on slow disks or network
+homes is dominated by I/O. While we wait for the previous steam instance to
+exit, a low priority background thread can ask the kernel to read ahead the
+files that the next steam will need, using ``posix_fadvise(WILLNEED)``. The
+amount of data is limited by a budget, so that we don't evict more useful
+data from the cache.
+
+This module must not import Qt, since it is also used by the CLI.
+"""
+
+from .util import lower_thread_priority
+
+import logging
+import os
+import threading
+from time import time
+
+
+# Subfolders of steam's root that contain user data or games rather than
+# the steam runtime:
+SKIP_DIRS = {
+    'acolyte', 'appcache', 'config', 'depotcache', 'dumps', 'logs',
+    'steamapps', 'userdata',
+}
+
+MIB = 1024 * 1024
+
+
+def supported():
+    """Check whether prefetching is available on this platform."""
+    return hasattr(os, 'posix_fadvise')
+
+
+class Prefetcher:
+
+    """Background thread that advises the kernel to read files below the
+    given folders, until ``budget`` bytes have been covered."""
+
+    def __init__(self, folders, budget):
+        self.folders = folders
+        self.budget = budget
+        self.files = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        self._seen = set()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='prefetch', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Stop prefetching after the current file."""
+        self._cancelled.set()
+
+    def summary(self):
+        """Describe how much has been prefetched so far."""
+        return "Prefetched {:.1f} MiB in {} files".format(
+            self.bytes / MIB, self.files)
+
+    def is_running(self):
+        return self._thread.is_alive()
+
+    def _run(self):
+        lower_thread_priority()
+        start = time()
+        try:
+            for folder in self.folders:
+                if not self._walk(folder):
+                    break
+        finally:
+            self.elapsed = time() - start
+            logging.getLogger(__name__).info(
+                "Prefetched %.1f MiB in %d files (%.2f s)",
+                self.bytes / MIB, self.files, self.elapsed)
+
+    def _walk(self, folder):
+        """Prefetch all files below folder. Returns false when done."""
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            return True
+        dirs = []
+        for entry in entries:
+            if self._cancelled.is_set() or self.bytes >= self.budget:
+                return False
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIP_DIRS:
+                        dirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    self._prefetch(entry)
+            except OSError:
+                continue
+        # Files first: the executables and libraries of the steam client
+        # are mostly in the upper levels of the tree:
+        return all(self._walk(path) for path in dirs)
+
+    def _prefetch(self, entry):
+        stat = entry.stat(follow_symlinks=False)
+        key = (stat.st_dev, stat.st_ino)
+        if key in self._seen or not stat.st_size:
+            return
+        self._seen.add(key)
+        size = min(stat.st_size, self.budget - self.bytes)
+        fd = os.open(entry.path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, size, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+        self.files += 1
+        self.bytes += size
+
+
+def prefetch(folders, budget_mib):
+    """Start prefetching up to ``budget_mib`` MiB from the given folders in
+    the background. Returns the ``Prefetcher``, or ``None`` if prefetching
+    is disabled or not supported."""
+    if not budget_mib or not supported():
+        return None
+    return Prefetcher(folders, int(budget_mib * MIB)).start()
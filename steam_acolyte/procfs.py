@@ -0,0 +1,139 @@
+"""
+Find processes that keep steam's IPC pipe open (linux only).
+
+Games started from steam inherit ``steam.pipe`` and can keep it open after
+steam itself has exited, which prevents us from acquiring the steam lock.
+This module finds these processes by looking at their file descriptors in
+``/proc``, and allows to wait for all of them at once.
+"""
+
+from .util import Tracer
+
+from collections import namedtuple
+import os
+import select
+from time import sleep, time
+
+
+trace = Tracer(__name__)
+
+Holder = namedtuple('Holder', ['pid', 'name'])
+
+
+class PipeHolders:
+
+    """Scanner for processes that have a given file open.
+
+    Results are cached per process, identified by pid and start time (pids
+    can be reused). Processes can only start holding the pipe by inheriting
+    it from a holder or by opening it explicitly, which only steam clients do
+    and only for a moment - so a process that was not holding the pipe on a
+    previous scan is not scanned again."""
+
+    def __init__(self, path):
+        self.path = path
+        self._cache = {}
+
+    def scan(self):
+        """Return list of ``Holder`` that currently have the file open. Raises
+        ``OSError`` if ``/proc`` is not available."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        target = (st.st_dev, st.st_ino)
+        cache, self._cache = self._cache, {}
+        holders = []
+        with os.scandir('/proc') as entries:
+            for entry in entries:
+                if not entry.name.isdigit():
+                    continue
+                pid = int(entry.name)
+                key = (pid, _start_time(pid))
+                if key[1] is None:
+                    continue
+                holds = cache.get(key)
+                if holds is None or holds:
+                    holds = _has_open(pid, target)
+                self._cache[key] = holds
+                if holds:
+                    holders.append(Holder(pid, _process_name(pid)))
+        return holders
+
+
+def wait_any(pids, timeout):
+    """Wait until any of the given processes exits, or the timeout (in
+    seconds) expires."""
+    fds = []
+    try:
+        for pid in pids:
+            try:
+                fds.append(os.pidfd_open(pid))
+            except ProcessLookupError:
+                return
+        poll = select.poll()
+        for fd in fds:
+            poll.register(fd, select.POLLIN)
+        poll.poll(timeout * 1000)
+    except (AttributeError, OSError):
+        # No pidfd support (python < 3.9 or linux < 5.3):
+        deadline = time() + timeout
+        while time() < deadline and all(_is_running(pid) for pid in pids):
+            sleep(0.010)
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
+def _start_time(pid):
+    """Return start time of the process in clock ticks after boot."""
+    try:
+        with open('/proc/{}/stat'.format(pid), 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The second field (comm) is in parentheses and can contain spaces:
+    fields = stat[stat.rfind(b')') + 2:].split()
+    return int(fields[19])
+
+
+def _has_open(pid, target):
+    """Check if the process has a file descriptor for the given file."""
+    try:
+        with os.scandir('/proc/{}/fd'.format(pid)) as entries:
+            for entry in entries:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if (st.st_dev, st.st_ino) == target:
+                    return True
+    except OSError:     # not ours, or already gone
+        pass
+    return False
+
+
+def _process_name(pid):
+    """Return a human readable name for the process."""
+    try:
+        with open('/proc/{}/cmdline'.format(pid), 'rb') as f:
+            argv0 = f.read().split(b'\0', 1)[0].decode('utf-8', 'replace')
+    except OSError:
+        argv0 = ''
+    # Wine processes have windows paths:
+    name = argv0.replace('\\', '/').rsplit('/', 1)[-1]
+    if name:
+        return name
+    try:
+        with open('/proc/{}/comm'.format(pid)) as f:
+            return f.read().strip()
+    except OSError:
+        return str(pid)
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
@@ -0,0 +1,128 @@
+"""
+Optional profiling hooks that can be enabled from the command line to
+capture performance data in the field:
+
+- ``--profile FILE``: cProfile statistics, readable with the ``pstats``
+  module. Written at exit, or on demand from the tray menu. cProfile only
+  covers the thread in which it was enabled, so functions that run in
+  background threads (startup stages, ``AsyncTask``) are wrapped with
+  ``profiled()``, and their statistics are merged into those of the main
+  thread.
+- ``--memprofile FILE``: tracemalloc snapshots saved as ``FILE.NNN-LABEL``
+  at interesting points in the program (see ``checkpoint()``), or on demand.
+
+All functions are no-ops if profiling was not enabled.
+"""
+
+import atexit
+import functools
+import logging
+import threading
+
+
+_profile = None
+_thread_stats = None            # merged pstats.Stats of background tasks
+_lock = threading.Lock()
+_profile_file = None
+_mem_file = None
+_mem_counter = 0
+
+
+def start(profile_file=None, mem_file=None):
+    """Start profiling, and arrange for the results to be saved at exit."""
+    global _profile, _profile_file, _mem_file
+    if mem_file:
+        import tracemalloc
+        tracemalloc.start()
+        _mem_file = mem_file
+    if profile_file:
+        import cProfile
+        _profile = cProfile.Profile()
+        _profile_file = profile_file
+        _profile.enable()
+    if enabled():
+        atexit.register(stop)
+
+
+def enabled():
+    """Check whether any kind of profiling is active."""
+    return bool(_profile or _mem_file)
+
+
+def profiled(func):
+    """Wrap ``func`` so that it is profiled when called on a background
+    thread."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        main = threading.current_thread() is threading.main_thread()
+        if not _profile or main:
+            return func(*args, **kwargs)
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            _merge(profile)
+    return wrapper
+
+
+def _merge(profile):
+    global _thread_stats
+    import pstats
+    with _lock:
+        if _thread_stats is None:
+            _thread_stats = pstats.Stats(profile)
+        else:
+            _thread_stats.add(profile)
+
+
+def _save():
+    """Save statistics of the main thread and of finished background
+    tasks."""
+    import pstats
+    stats = pstats.Stats(_profile)
+    with _lock:
+        if _thread_stats is not None:
+            stats.add(_thread_stats)
+    stats.dump_stats(_profile_file)
+
+
+def checkpoint(label):
+    """Save a tracemalloc snapshot with the given label."""
+    global _mem_counter
+    if not _mem_file:
+        return
+    import tracemalloc
+    if not tracemalloc.is_tracing():
+        return
+    _mem_counter += 1
+    filename = '{}.{:03d}-{}'.format(_mem_file, _mem_counter, label)
+    tracemalloc.take_snapshot().dump(filename)
+    logging.getLogger(__name__).info("Saved memory snapshot: %s", filename)
+
+
+def dump():
+    """Save the profiling data collected so far."""
+    if _profile:
+        _profile.disable()
+        _save()
+        _profile.enable()
+        logging.getLogger(__name__).info(
+            "Saved profile: %s", _profile_file)
+    checkpoint('dump')
+
+
+def stop():
+    """Save profiling results and stop profiling."""
+    global _profile, _mem_file
+    if _profile:
+        _profile.disable()
+        _save()
+        _profile = None
+    if _mem_file:
+        import tracemalloc
+        checkpoint('exit')
+        tracemalloc.stop()
+        _mem_file = None
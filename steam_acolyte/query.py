@@ -0,0 +1,68 @@
+"""
+Headless queries that can be run without starting the GUI.
+
+These commands do not take the acolyte instance lock and do not import Qt,
+so they are cheap enough to be executed periodically by monitoring scripts.
+Every result is printed as one JSON object per line.
+"""
+
+from steam_acolyte.config import SteamConfig
+from steam_acolyte.userdata import account_id, steam_id
+
+import json
+import sys
+
+
+def run_query(opts):
+    """Execute the query requested on the command line."""
+    try:
+        steam = SteamConfig(
+            opts['--prefix'],
+            opts['--root'],
+            opts['--exe'])
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if opts['list']:
+        for user in steam.users(update=False):
+            emit({
+                'steam_id': user.steam_id,
+                'account': user.account_name,
+                'persona': user.persona_name,
+                'timestamp': user.timestamp,
+            })
+    elif opts['status']:
+        emit(steam.status())
+    elif opts['current']:
+        emit({'account': steam.get_last_user()})
+    elif opts['stats']:
+        stats = steam.journal.stats().values()
+        for s in sorted(stats, key=lambda s: s.last, reverse=True):
+            emit(s.to_json())
+    elif opts['usage']:
+        usage = steam.disk_usage.usage()
+        for user in steam.users(update=False):
+            aid = account_id(user.steam_id)
+            emit({
+                'account': user.account_name,
+                'steam_id': user.steam_id,
+                'account_id': aid,
+                'bytes': usage.pop(aid, 0),
+            })
+        # Leftovers of accounts that are no longer in the list:
+        for aid, size in sorted(usage.items()):
+            emit({
+                'account': None,
+                'steam_id': steam_id(aid),
+                'account_id': aid,
+                'bytes': size,
+            })
+    elif opts['history']:
+        for entry in steam.edits.history():
+            emit(entry)
+    return 0
+
+
+def emit(record):
+    """Print a single JSON record."""
+    print(json.dumps(record, separators=(',', ':')), flush=True)
@@ -0,0 +1,172 @@
+"""
+Run several steam accounts side by side in sandboxed prefixes (linux only).
+
+Each sandbox is a separate HOME folder in ``acolyte_data/sandboxes`` with
+its own steam prefix and root. Only the files that steam writes per session
+(config, logs, caches, pid file and pipe) are private to the sandbox. All
+other entries of steam's root (runtime, binaries, games) are symlinks into
+the shared installation, so that the sandboxes take up almost no additional
+disk space.
+
+Note that the shared entries are not read-only: read-only bind mounts would
+need privileges, and copies would defeat the purpose. Concurrent steam
+instances may therefore write to the same files, e.g. when several of them
+update the same game at once.
+
+Every sandbox gets its own ``Steam`` instance with separate locks, pipe and
+process. Login information is restored from and stored to the vault of the
+main installation, and sessions are recorded in its journal.
+"""
+
+from .util import Tracer
+
+from urllib.parse import quote
+import os
+import shutil
+import sys
+
+
+trace = Tracer(__name__)
+
+# Entries in steam's root that are private to each sandbox:
+PRIVATE_DIRS = {'acolyte', 'appcache', 'config', 'dumps', 'logs'}
+
+# Entries in steam's prefix that must not be shared or copied:
+SKIP_PREFIX = {'steam.pid', 'steam.pipe'}
+
+
+class Sandbox:
+
+    """Sandboxed steam prefix for a single account."""
+
+    def __init__(self, steam, account):
+        self.main = steam
+        self.account = account
+        self.path = os.path.join(
+            steam.acolyte_data, 'sandboxes', quote(account.lower(), safe=''))
+        self.home = os.path.join(self.path, 'home')
+        self.prefix = os.path.join(self.home, '.steam')
+        self.root = os.path.join(self.home, '.local', 'share', 'Steam')
+        self.log = os.path.join(self.path, 'steam.log')
+
+    @trace.method
+    def create(self):
+        """Create or update the sandbox folders. Existing private files are
+        kept, links to new entries in the shared root are added."""
+        main = self.main
+        os.makedirs(self.prefix, exist_ok=True)
+        os.makedirs(self.root, exist_ok=True)
+        for entry in os.scandir(main.root):
+            dest = os.path.join(self.root, entry.name)
+            if os.path.lexists(dest):
+                continue
+            if entry.name in PRIVATE_DIRS or entry.name.startswith('ssfn'):
+                if entry.name == 'config':
+                    shutil.copytree(entry.path, dest, symlinks=True)
+                elif entry.is_dir():
+                    os.mkdir(dest)
+            else:
+                os.symlink(entry.path, dest)
+        for entry in os.scandir(main.prefix):
+            dest = os.path.join(self.prefix, entry.name)
+            if entry.name in SKIP_PREFIX or os.path.lexists(dest):
+                continue
+            if entry.is_symlink():
+                os.symlink(self._map_link(entry.path), dest)
+            elif entry.is_file():
+                shutil.copy2(entry.path, dest)
+        if not os.path.lexists(os.path.join(self.prefix, 'steam')):
+            os.symlink(self.root, os.path.join(self.prefix, 'steam'))
+
+    def _map_link(self, path):
+        """Return target for a symlink in the sandbox prefix. Links into the
+        main root are redirected to the sandbox root."""
+        target = os.path.realpath(path)
+        rel = os.path.relpath(target, self.main.root)
+        if rel == os.curdir:
+            return self.root
+        if rel.startswith(os.pardir):
+            return target
+        return os.path.join(self.root, rel)
+
+    def steam(self):
+        """Return a ``Steam`` instance for this sandbox. The sandbox must have
+        been created."""
+        from .steam import Steam
+        steam = Steam(self.prefix, self.root, self.main.exe, self.log)
+        steam.env = {'HOME': self.home}
+        steam.vault = self.main.vault
+        steam.journal = self.main.journal
+        return steam
+
+    @trace.method
+    def prepare(self, steam):
+        """Remove all other accounts from the sandbox config, and set up the
+        login of our account."""
+        others = [u.account_name for u in steam.users()
+                  if u.account_name.lower() != self.account.lower()]
+        # Keep their login information in the vault of the main installation:
+        steam.remove_users(others, forget=False)
+        steam.switch_user(self.account)
+
+
+def run_sandboxes(opts):
+    """Run steam for each of the given accounts in its own sandbox, and wait
+    until all of them have exited."""
+    from PyQt5.QtCore import QCoreApplication
+    from .async_ import AsyncTask
+    from .config import SteamConfig
+
+    if sys.platform == 'win32':
+        print("Sandboxes are not supported on windows.", file=sys.stderr)
+        return 1
+    try:
+        main = SteamConfig(opts['--prefix'], opts['--root'], opts['--exe'])
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    from .app import init_app
+    app = QCoreApplication([])
+    init_app()
+    running = []
+    tasks = {}
+
+    def finished(sandbox, steam):
+        # Wait in the background, so the other sandboxes are not blocked:
+        task = tasks[steam] = AsyncTask(steam.wait_for_lock)
+        task.finished.connect(lambda: on_locked(sandbox, steam))
+        task.start()
+
+    def on_locked(sandbox, steam):
+        del tasks[steam]
+        steam.store_users()
+        steam.unlock()
+        steam.release_acolyte_instance_lock()
+        steam.journal.flush()
+        print("{}: steam has exited.".format(sandbox.account))
+        running.remove(steam)
+        if not running:
+            app.quit()
+
+    for account in opts['<ACCOUNT>']:
+        sandbox = Sandbox(main, account)
+        sandbox.create()
+        steam = sandbox.steam()
+        first, locked = steam.lock()
+        if not first or not locked:
+            print("{}: sandbox is already in use.".format(account))
+            steam.unlock()
+            steam.release_acolyte_instance_lock()
+            continue
+        sandbox.prepare(steam)
+        steam.unlock()
+        process = steam.run()
+        process.finished.connect(
+            lambda *_, sandbox=sandbox, steam=steam: finished(sandbox, steam))
+        running.append(steam)
+        print("{}: started steam in {}".format(account, sandbox.home))
+
+    if not running:
+        return 1
+    return app.exec_()
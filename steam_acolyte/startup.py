@@ -0,0 +1,104 @@
+"""
+Startup as a small dependency graph of stages.
+
+Stages are either submitted to a worker pool, or run on the main thread
+(e.g. everything that creates widgets). Each stage records its wall time,
+which can be printed along with the critical path using ``--startup-profile``.
+"""
+
+from .profiling import profiled
+
+from concurrent.futures import Future
+from time import perf_counter
+import sys
+
+
+class Stage:
+
+    def __init__(self, name, deps, after=None):
+        self.name = name
+        self.deps = deps
+        self.after = after
+        self.start = None
+        self.end = None
+        self.future = Future()
+
+
+class Startup:
+
+    """Execute startup stages in the order of their dependencies."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.stages = {}
+        self.t0 = perf_counter()
+        self._main = None
+
+    def submit(self, name, func, *deps):
+        """Execute ``func`` on the worker pool, as soon as all the stages it
+        depends on have finished. ``func`` receives the results of the
+        dependencies as arguments."""
+        stage = self.stages[name] = Stage(name, deps)
+        self.pool.submit(profiled(self._execute), stage, func)
+        return stage.future
+
+    def run(self, name, func, *deps):
+        """Execute ``func`` on the current (main) thread, and return its
+        result. Main thread stages implicitly depend on each other."""
+        stage = self.stages[name] = Stage(name, deps, self._main)
+        self._main = name
+        self._execute(stage, func)
+        return stage.future.result()
+
+    def result(self, name):
+        """Wait for the given stage and return its result."""
+        return self.stages[name].future.result()
+
+    def _execute(self, stage, func):
+        try:
+            args = [self.result(dep) for dep in stage.deps]
+            stage.start = perf_counter()
+            result = func(*args)
+        except BaseException as e:
+            stage.end = perf_counter()
+            stage.future.set_exception(e)
+        else:
+            stage.end = perf_counter()
+            stage.future.set_result(result)
+
+    def critical_path(self, name):
+        """Return the chain of stages that determined when the given stage
+        could start, ending with the stage itself."""
+        path = []
+        stage = self.stages.get(name)
+        while stage is not None:
+            path.append(stage)
+            deps = [self.stages[dep] for dep in stage.deps + (stage.after,)
+                    if dep and self.stages[dep].start is not None]
+            stage = max(deps, key=lambda s: s.end, default=None)
+        return path[::-1]
+
+    def report(self, name=None, file=None):
+        """Print wall time of all stages, and the critical path leading up to
+        the given stage (default: the last main thread stage)."""
+        name = name or self._main
+        file = file or sys.stderr
+        print("{:<12} {:>9} {:>9} {:>9}  {}".format(
+            'stage', 'start', 'end', 'wall', 'depends on'), file=file)
+        for stage in sorted(self.stages.values(), key=lambda s: s.start or 0):
+            if stage.start is None or stage.end is None:
+                continue
+            print("{:<12} {:>9} {:>9} {:>9}  {}".format(
+                stage.name,
+                _ms(stage.start - self.t0),
+                _ms(stage.end - self.t0),
+                _ms(stage.end - stage.start),
+                ', '.join(stage.deps)), file=file)
+        path = self.critical_path(name)
+        print("critical path: {} ({})".format(
+            ' -> '.join(s.name for s in path),
+            _ms(path[-1].end - self.t0) if path else '-'), file=file)
+
+
+def _ms(seconds):
+    return '{:.1f}ms'.format(seconds * 1000)
@@ -1,116 +1,60 @@
-from .util import read_file, write_file, subkey_lookup, Tracer
-
-from PyQt5.QtCore import QObject, pyqtSignal, QProcess
-import vdf
-
-import os
-import sys
+from .config import (                                   # noqa: F401
+    SteamConfig, SteamImpl, SteamBase, SteamUser,
+)
+from .util import Tracer
+from .logfile import RotatingLog
+from .milestones import OutputTap
+from . import supervise
+
+from PyQt5.QtCore import (
+    QObject, pyqtSignal, QIODevice, QProcess, QProcessEnvironment, QTimer,
+)
+
+import logging
 import shlex
-from time import sleep
-from abc import abstractmethod
-
-if sys.platform == 'win32':
-    from .steam_win32 import SteamWin32 as SteamImpl
-else:
-    from .steam_linux import SteamLinux as SteamImpl
+import sys
+from time import sleep, time
 
 
 trace = Tracer(__name__)
 
+# Commands that are received while we hold the lock, but make no sense to
+# forward to steam:
+IGNORED_COMMANDS = {('-shutdown',)}
 
-class SteamUser:
-
-    def __init__(self, steam_id, account_name, persona_name, timestamp):
-        self.steam_id = steam_id
-        self.account_name = account_name
-        self.persona_name = persona_name
-        self.timestamp = timestamp
-
-
-class SteamBase:
-
-    """This defines the methods that need to be provided by the platform
-    specific implementations (SteamLinux/SteamWin32)."""
-
-    # Paths that must be set by __init__:
-    prefix: str
-    root: str
-    exe: str
-    steam_config: str
-    acolyte_data: str
-
-    @abstractmethod
-    def __init__(self, prefix=None, root=None, exe=None):
-        """Locate and set paths of steam installation and acolyte data."""
-        super().__init__()
-
-    @abstractmethod
-    def get_last_user(self):
-        """Return username which was last logged on."""
-
-    @abstractmethod
-    def set_last_user(self, username):
-        """Tell steam to login given user at next start."""
-
-    # IPC:
-
-    @abstractmethod
-    def _is_steam_pid_valid(self):
-        """Check if the saved steam PID file belongs to a running process."""
-
-    @abstractmethod
-    def _set_steam_pid(self):
-        """Save current process ID as the last steam PID."""
-
-    @abstractmethod
-    def _unset_steam_pid(self):
-        """Remove current process ID as the last steam PID."""
-
-    @abstractmethod
-    def _connect(self) -> bool:
-        """Connect to an already running steam instance. Returns true if
-        successful. Called after ``_is_steam_pid_valid()`` returned true."""
-
-    @abstractmethod
-    def _listen(self):
-        """Start listening to messages from other steam processes that want to
-        communicate their command line to us."""
+# Maximum number of bytes read at once from steam's output:
+READ_CHUNK_SIZE = 1024 * 1024
 
-    @abstractmethod
-    def _send(self, args: list):
-        """Send command line to connected steam instance. Only valid if
-        previously ``_connect()``-ed."""
+# How long to wait for a newly started steam to accept queued commands:
+FORWARD_INTERVAL = 500          # ms
+FORWARD_TIMEOUT = 300           # s
 
-    @abstractmethod
-    def unlock(self):
-        """Close connection to other steam instance, or stop listening."""
 
-    @abstractmethod
-    def ensure_single_acolyte_instance(self):
-        """Ensure that we are the only acolyte instance."""
-
-    @abstractmethod
-    def release_acolyte_instance_lock(self):
-        """Allow other acolyte instances to run again."""
-
-    @abstractmethod
-    def wait_for_steam_exit(self):
-        """Wait until steam is closed."""
-
-
-class Steam(SteamImpl, SteamBase, QObject):
+class Steam(SteamConfig, QObject):
 
     """This class allows various interactions with steam. Note that many of
     the methods are only safe to use while steam is not running."""
 
     command_received = pyqtSignal(str)
+    pipe_held = pyqtSignal(list)
+    milestone = pyqtSignal(str, float)
 
-    def __init__(self, prefix=None, root=None, exe=None, log=None, args=()):
+    def __init__(self, prefix=None, root=None, exe=None, log=None, args=(),
+                 log_size=0, log_keep=5):
         super().__init__(prefix, root, exe)
         self.log = log
+        self.log_size = log_size
+        self.log_keep = log_keep
         self.args = args
+        self.env = None             # dict of environment overrides
+        # Read steam's output to detect milestones and rotate the log. If
+        # false, steam writes directly to the log or to our stdout/stderr,
+        # so that we don't wake up whenever it prints something:
+        self.scan_output = True
         self._has_acolyte_lock = False
         self._has_steam_lock = False
+        self._commands = []
+        self._forward_timer = None
         self.command_received.connect(self._steam_cmdl_received)
         trace('Init Steam(prefix=%r, root=%r, exe=%r, logfile=%r, args=%r)',
               self.prefix, self.root, self.exe, self.log, self.args)
@@ -178,77 +122,170 @@ class Steam(SteamImpl, SteamBase, QObject):
                 return (True, True)
             sleep(0.050)
 
+    def _pipe_held_by(self, holders):
+        # May be called from a worker thread. Connected slots in the main
+        # thread will be executed there:
+        self.pipe_held.emit(holders)
+
     @trace.method
     def _steam_cmdl_received(self, line):
         """When steam is executed while we hold the steam instance lock, this
-        function receives and stores steam's command line arguments."""
-        self.args = shlex.split(line.rstrip())[1:]
-
-    def users(self):
-        """Return a list of ``SteamUser``."""
-        config = self.read_config('loginusers.vdf')
-        users = subkey_lookup(config, r'users')
-        return [
-            SteamUser(uid, u['AccountName'], u['PersonaName'], u['Timestamp'])
-            for uid, u in users.items()
-        ]
-
-    @trace.method
-    def remove_user(self, username):
-        """Delete login token and remove account from the list of saved
-        accounts."""
-        loginusers = self.read_config('loginusers.vdf')
-        loginusers['users'] = {
-            uid: info
-            for uid, info in subkey_lookup(loginusers, r'users').items()
-            if info['AccountName'] != username
-        }
-        self.write_config('loginusers.vdf', loginusers)
-
-        config = self.read_config('config.vdf')
-        accounts = subkey_lookup(
-            config, r'InstallConfigStore\Software\Valve\Steam\Accounts')
-        accounts.pop(username, None)
-        self.write_config('config.vdf', config)
-
-    @trace.method
-    def switch_user(self, username):
-        """Switch login config to given user. Do not use this while steam is
-        running."""
-        self.set_last_user(username)
-        return True
+        function receives and queues steam's command line arguments. The
+        first command becomes the command line of the next steam process,
+        and the rest is forwarded to steam after it has started."""
+        args = tuple(shlex.split(line.rstrip())[1:])
+        if args not in self._commands and args not in IGNORED_COMMANDS:
+            self._commands.append(args)
+
+    def _take_commands(self, args=None):
+        """Return command line for the next steam process, and the list of
+        commands to forward to it. Clears the queue. If ``args`` is given,
+        it is used as command line and all queued commands are forwarded."""
+        commands, self._commands = self._commands, []
+        if args is not None:
+            return list(args), commands
+        if not commands:
+            return list(self.args), []
+        return list(commands[0]), commands[1:]
+
+    def _forward_commands(self, process, commands):
+        """Send queued commands to steam as soon as it listens on its IPC
+        channel."""
+        if self._forward_timer is not None:
+            self._forward_timer.stop()
+        if not commands:
+            return
+        deadline = time() + FORWARD_TIMEOUT
+        timer = self._forward_timer = QTimer(self)
+        timer.setInterval(FORWARD_INTERVAL)
+
+        def poll():
+            if (process.state() == QProcess.NotRunning or
+                    time() > deadline or self.has_steam_lock()):
+                trace('Dropping %d queued steam commands', len(commands))
+                timer.stop()
+            elif self._connect():
+                try:
+                    for args in commands:
+                        self._send([self.exe, *args])
+                finally:
+                    self._disconnect()
+                timer.stop()
+
+        timer.timeout.connect(poll)
+        timer.start()
 
     @trace.method
-    def run(self):
-        """Run steam."""
+    def run(self, args=None):
+        """Run steam. Uses the given arguments, or the first command that
+        was received from another steam process, or the default ones."""
         process = self._process = QProcess()
         process.setInputChannelMode(QProcess.ForwardedInputChannel)
-        if self.log:
+        tap = OutputTap(self._milestone_reached)
+        if not self.scan_output:
+            if self.log:
+                process.setProcessChannelMode(QProcess.MergedChannels)
+                process.setStandardOutputFile(self.log, QIODevice.Append)
+            else:
+                process.setProcessChannelMode(QProcess.ForwardedChannels)
+        elif self.log:
             process.setProcessChannelMode(QProcess.MergedChannels)
-            process.setStandardOutputFile(self.log)
+            log = RotatingLog(self.log, self.log_size, self.log_keep)
+            process.readyReadStandardOutput.connect(
+                lambda: self._read_output(process, tap, log))
+            process.finished.connect(
+                lambda *_: (self._read_output(process, tap, log), log.close()))
+            # finished() is not emitted if steam can't be started:
+            process.errorOccurred.connect(
+                lambda error: error == QProcess.FailedToStart and log.close())
         else:
-            process.setProcessChannelMode(QProcess.ForwardedChannels)
-
-        process.start(self.exe, self.args)
+            # Pass the output through to our own, so that it can be scanned:
+            process.setProcessChannelMode(QProcess.SeparateChannels)
+            stdout = getattr(sys.stdout, 'buffer', None)
+            stderr = getattr(sys.stderr, 'buffer', None)
+            process.readyReadStandardOutput.connect(
+                lambda: self._read_output(
+                    process, tap, stdout, QProcess.StandardOutput))
+            process.readyReadStandardError.connect(
+                lambda: self._read_output(
+                    process, tap, stderr, QProcess.StandardError))
+            process.finished.connect(
+                lambda *_: (
+                    self._read_output(
+                        process, tap, stdout, QProcess.StandardOutput),
+                    self._read_output(
+                        process, tap, stderr, QProcess.StandardError)))
+        if self.env:
+            env = QProcessEnvironment.systemEnvironment()
+            for name, value in self.env.items():
+                env.insert(name, value)
+            process.setProcessEnvironment(env)
+
+        args, pending = self._take_commands(args)
+        user = self.get_last_user()
+        start = time()
+        self.journal.started(user, start)
+        process.finished.connect(
+            lambda exit_code, *_: self.journal.record(
+                user, start, time(), exit_code, tap.events))
+        process.start(self.exe, args)
+        self._forward_commands(process, pending)
         return process
 
+    def _read_output(self, process, tap, sink, channel=None):
+        """Move all available output of the steam process to the sink (a
+        log or binary stream, or ``None`` to discard), and scan it for
+        milestones."""
+        if channel is not None:
+            process.setReadChannel(channel)
+        while True:
+            data = process.read(READ_CHUNK_SIZE)
+            if not data:
+                break
+            tap.feed(data, channel)
+            if sink is not None:
+                sink.write(data)
+        # The log is buffered on purpose, but passed through output should
+        # show up immediately:
+        if channel is not None and sink is not None:
+            sink.flush()
+
+    def _milestone_reached(self, name, seconds):
+        logging.getLogger(__name__).info(
+            "Steam milestone %r reached after %.2f s", name, seconds)
+        self.milestone.emit(name, seconds)
+
+    @trace.method
+    def run_detached(self, args=None):
+        """Run steam in a detached supervisor process and return immediately.
+        When steam exits, the supervisor records the session, runs the
+        post-exit hooks and ``steam-acolyte store`` to update the vault."""
+        # Only the first queued command can be passed on here, because we
+        # won't be around to forward the rest:
+        args, _ = self._take_commands(args)
+        if getattr(sys, 'frozen', False):
+            # There is no python interpreter to run the supervisor with:
+            logging.getLogger(__name__).warning(
+                "Steam is not supervised in this build: the session is not "
+                "recorded, no post-exit hooks are run, and the saved "
+                "accounts are updated only on the next start of acolyte.")
+            QProcess.startDetached(self.exe, args)
+            return
+        user = self.get_last_user()
+        self.journal.started(user, time())
+        supervise.spawn(
+            [self.exe, *args],
+            journal=self.journal.filename,
+            user=user,
+            log=self.log,
+            hooks=self.hooks,
+            after=[sys.executable, '-m', 'steam_acolyte',
+                   '--prefix', self.prefix, '--root', self.root,
+                   '--exe', self.exe, 'store'])
+
     @trace.method
     def stop(self):
         """Signal steam to exit."""
         if not self.has_steam_lock():
             if self._is_steam_pid_valid() and self._connect():
                 self._send([self.exe, '-shutdown'])
-
-    @trace.method
-    def read_config(self, filename):
-        """Read a steam .vdf config file."""
-        conf = os.path.join(self.steam_config, filename)
-        text = read_file(conf)
-        return vdf.loads(text) if text else {}
-
-    @trace.method
-    def write_config(self, filename, data):
-        """Write a steam .vdf config file."""
-        conf = os.path.join(self.steam_config, filename)
-        text = vdf.dumps(data, pretty=True)
-        write_file(conf, text)
@@ -2,9 +2,9 @@ from .util import (
     read_file, write_file, join_args, subkey_lookup, Tracer,
     realpath, find_exe, samefile,
 )
+from .locations import CONFIGS
 
 import vdf
-from PyQt5.QtCore import QThread, pyqtSignal
 
 import fcntl
 import os
@@ -14,31 +14,6 @@ import logging
 
 trace = Tracer(__name__)
 
-# I tested this script on an ubuntu and archlinux machine, where I found
-# the steam config and program files in different locations. In both cases
-# there was also a path/symlink that pointed to the correct location:
-#
-#             common name           ubuntu            archlinux
-#   config    ~/.steam/steam@   ->  ~/.steam/steam    ~/.local/share/Steam
-#   data      ~/.steam/root@    ->  ~/.steam          ~/.local/share/Steam
-CONFIGS = {
-    'DEFAULT': {
-        'exe': 'steam',
-        'prefix': '~/.steam',
-        'root': '~/.steam/steam',
-    },
-    'NATIVE': {
-        'exe': 'steam-native',
-        'prefix': '~/.steam',
-        'root': '~/.steam/steam',
-    },
-    'FLATPACK': {
-        'exe': 'com.valvesoftware.Steam',
-        'prefix': '~/.var/app/com.valvesoftware.Steam/.steam',
-        'root': '~/.var/app/com.valvesoftware.Steam/steam',
-    },
-}
-
 
 class SteamLinux:
 
@@ -143,8 +118,7 @@ class SteamLinux:
         steam_config['AutoLoginUser'] = username
         steam_config['RememberPassword'] = '1'
         reg_data = vdf.dumps(reg_data, pretty=True)
-        with open(self.reg_file, 'wt') as f:
-            f.write(reg_data)
+        self._write_config_file(self.reg_file, reg_data.encode('utf-8'))
 
     def _is_steam_pid_valid(self):
         """Check if the steam.pid file designates a running process."""
@@ -177,8 +151,23 @@ class SteamLinux:
         self._pipe_fd = self._open_pipe_for_writing(self.pipe_file)
         return self._pipe_fd != -1
 
+    @trace.method
+    def _disconnect(self):
+        if self._pipe_fd != -1 and not self._has_steam_lock:
+            os.close(self._pipe_fd)
+            self._pipe_fd = -1
+
+    @trace.method
+    def _is_steam_listening(self):
+        fd = self._open_pipe_for_writing(self.pipe_file)
+        if fd == -1:
+            return False
+        os.close(fd)
+        return True
+
     @trace.method
     def _listen(self):
+        from .async_ import FileReaderThread
         self._has_steam_lock = True
         self._pipe_fd = self._open_pipe_for_reading(self.pipe_file)
         self._thread = FileReaderThread(self._pipe_fd)
@@ -228,11 +217,31 @@ class SteamLinux:
 
     @trace.method
     def wait_for_steam_exit(self):
-        """Wait until steam is closed."""
+        """Wait until steam is closed, and no other process (e.g. a game)
+        keeps steam.pipe open."""
+        from .procfs import PipeHolders, wait_any
+        pid = self._read_steam_pid()
+        scanner = PipeHolders(os.path.expanduser(self.pipe_file))
+        blocking = None
+        while True:
+            try:
+                holders = scanner.scan()
+            except OSError:
+                break
+            pids = [h.pid for h in holders]
+            if pid and is_process_running(pid):
+                pids.append(pid)
+            elif blocking != holders:
+                blocking = holders
+                self._pipe_held_by(holders)
+            if not pids:
+                return
+            # Rescan from time to time, because holders may have spawned
+            # child processes that inherited the pipe:
+            wait_any(pids, 1.0)
         # Unfortunately, we have to poll here because we can't os.wait() for
         # non-child processes, and the alternatives using the ptrace, inotifyd
         # or netlink interfaces are much more involved.
-        pid = self._read_steam_pid()
         while pid and is_process_running(pid):
             sleep(0.010)
 
@@ -268,41 +277,6 @@ class SteamLinux:
         return os.open(path, os.O_RDWR)
 
 
-class FileReaderThread(QThread):
-
-    """Read a file asynchronously. Emit signal whenever a new line becomes
-    available."""
-
-    line_received = pyqtSignal(str)
-
-    def __init__(self, fd):
-        super().__init__()
-        self._fd = fd
-        self._exit = False
-
-    def run(self):
-        # `dup()`-ing the file descriptor serves two purposes here:
-        # - leave the `self._fd` open when `f` reaches its end of life
-        # - allow writing to `self._fd` without blocking from the main thread
-        with os.fdopen(os.dup(self._fd)) as f:
-            for line in f:
-                line = line.rstrip('\n')
-                if line:
-                    self.line_received.emit(line)
-                elif self._exit:
-                    return
-
-    def stop(self):
-        self._exit = True
-        # We have to wake up the reader thread by sending an empty line. I
-        # first tried to close the file directly, but it turns out this blocks
-        # the main thread and does not wake up the reader thread. Note that
-        # this operation would block if we hadn't dup()-ed the file descriptor
-        # for the reader thread:
-        os.write(self._fd, b"\n")
-        self.wait()
-
-
 def is_process_running(pid):
     """Check if a process with the given PID is currently running."""
     try:
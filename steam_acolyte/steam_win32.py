@@ -1,7 +1,5 @@
 from .util import join_args, import_declarations, Tracer, realpath, find_exe
 
-from PyQt5.QtCore import QWinEventNotifier
-
 from ctypes import wintypes, windll, WinError, GetLastError
 import os
 from types import SimpleNamespace
@@ -91,9 +89,12 @@ class SteamWin32:
 
     @trace.method
     def _is_steam_pid_valid(self):
-        pid = reg.QueryValueEx(self._ipc_key, 'SteamPID')[0]
+        pid = self._read_steam_pid()
         return pid and is_process_running(pid)
 
+    def _read_steam_pid(self):
+        return reg.QueryValueEx(self._ipc_key, 'SteamPID')[0]
+
     @trace.method
     def _set_steam_pid(self):
         reg.SetValueEx(self._ipc_key, 'SteamPID', 0, reg.REG_DWORD, os.getpid())
@@ -108,8 +109,23 @@ class SteamWin32:
             EVENT_MODIFY_STATE, False, self.EVENT_NAME)
         return bool(self._event)
 
+    @trace.method
+    def _disconnect(self):
+        if self._event and not self._has_steam_lock:
+            winapi.CloseHandle(self._event)
+            self._event = None
+
+    @trace.method
+    def _is_steam_listening(self):
+        event = winapi.OpenEventA(EVENT_MODIFY_STATE, False, self.EVENT_NAME)
+        if not event:
+            return False
+        winapi.CloseHandle(event)
+        return True
+
     @trace.method
     def _listen(self):
+        from PyQt5.QtCore import QWinEventNotifier
         self._has_steam_lock = True
         self._event = winapi.CreateEventA(
             None, False, False, self.EVENT_NAME)
@@ -164,8 +180,7 @@ class SteamWin32:
     @trace.method
     def wait_for_steam_exit(self):
         """Wait until steam is closed."""
-        pid = reg.QueryValueEx(self._ipc_key, 'SteamPID')[0]
-        return wait_process(pid)
+        return wait_process(self._read_steam_pid())
 
 
 def is_process_running(pid):
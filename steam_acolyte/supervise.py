@@ -0,0 +1,102 @@
+"""
+Minimal supervisor for steam sessions started with ``start --detach``.
+
+Usage:
+    python -m steam_acolyte.supervise [--journal FILE] [--user USER]
+        [--log FILE] [--hooks FOLDER] [--hook-timeout SEC]
+        [--hook-env NAME=VALUE]... [--after ARG]... -- EXE [ARG]...
+
+Runs steam as a child process, and waits for it to exit. Then records the
+session in acolyte's journal, runs the post-exit hooks and executes the
+``--after`` command line (used to run ``steam-acolyte store``, which
+re-acquires the locks after steam has exited). This keeps only a bare
+interpreter alive instead of a full acolyte process with Qt loaded. Must not
+import Qt.
+"""
+
+import os
+import subprocess
+import sys
+from time import time
+
+
+def main(args=None):
+    args = sys.argv[1:] if args is None else args
+    opts = {'--after': [], '--hook-env': []}
+    while args and args[0] != '--':
+        name, value, args = args[0], args[1], args[2:]
+        if name in ('--after', '--hook-env'):
+            opts[name].append(value)
+        else:
+            opts[name] = value
+    command = args[1:]
+
+    log = opts.get('--log')
+    output = open(log, 'ab') if log else None
+    start = time()
+    try:
+        exit_code = subprocess.call(
+            command, stdin=subprocess.DEVNULL,
+            stdout=output or subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    finally:
+        if output:
+            output.close()
+
+    if opts.get('--journal'):
+        from steam_acolyte.history import SessionJournal
+        journal = SessionJournal(opts['--journal'])
+        journal.record(opts.get('--user'), start, time(), exit_code)
+        journal.flush()
+
+    if opts.get('--hooks'):
+        from steam_acolyte.hooks import Hooks
+        hooks = Hooks(
+            opts['--hooks'],
+            dict(env.split('=', 1) for env in opts['--hook-env']),
+            timeout=float(opts.get('--hook-timeout', 30)))
+        hooks.start('post-exit', ACOLYTE_USER=opts.get('--user'),
+                    ACOLYTE_EXIT_CODE=exit_code)
+        # Nobody is waiting for us, so wait for all hooks:
+        hooks.wait(0)
+        hooks.shutdown()
+
+    after = opts['--after']
+    if after:
+        os.execv(after[0], after)
+    return 0
+
+
+def spawn(command, journal=None, user=None, log=None, hooks=None,
+          after=()):
+    """Start a detached supervisor for the given steam command line. The
+    post-exit hooks of the given ``Hooks`` are run after steam exits.
+    Returns without waiting for anything."""
+    args = [sys.executable, '-m', __name__]
+    if journal:
+        args += ['--journal', journal]
+    if user:
+        args += ['--user', user]
+    if log:
+        args += ['--log', log]
+    if hooks:
+        args += ['--hooks', hooks.folder,
+                 '--hook-timeout', str(hooks.timeout)]
+        for name, value in sorted(hooks.env.items()):
+            args += ['--hook-env', '{}={}'.format(name, value)]
+    for arg in after:
+        args += ['--after', arg]
+    args += ['--', *command]
+    kwargs = {}
+    if sys.platform == 'win32':
+        kwargs['creationflags'] = (
+            subprocess.DETACHED_PROCESS |
+            subprocess.CREATE_NEW_PROCESS_GROUP)
+    else:
+        kwargs['start_new_session'] = True
+    subprocess.Popen(
+        args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL, close_fds=True, **kwargs)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+Synchronize the saved accounts of several machines through a shared folder
+(e.g. on NFS).
+
+The unit of synchronization is the snapshot of an account in the vault,
+i.e. its entries in ``loginusers.vdf`` and ``config.vdf``. The shared folder
+contains:
+
+- ``objects/SHA1``: snapshots, named by the hash of their contents like in
+  the vault, so that unchanged accounts are never copied again
+- ``changes/MACHINE.log``: an append-only change log for each machine, one
+  JSON line ``{"a": ACCOUNT, "h": SHA1, "t": TIME}`` per change, where
+  ``"h": null`` marks a removed account
+
+Each machine only appends to its own log, so no locking is needed. For every
+other machine, we remember how far we have read its log, and only read the
+lines that were appended since. Changes whose snapshot is not available yet
+(e.g. on a slow network file system) are kept and retried on the next sync.
+
+Changes of the same account are resolved by timestamp: the newest change
+wins, no matter on which machine it was made. Local changes are detected by
+the next sync, and dated by when they happened, i.e. the time of the login
+that steam recorded, or when the vault noticed the change. Remote changes
+are merged before local ones are pushed, so an older local change loses
+against a newer remote one.
+
+The local state is kept in ``acolyte/sync.json``.
+
+This module must not import Qt.
+"""
+
+from .util import read_file, write_file_atomic
+
+import hashlib
+import json
+import os
+import re
+import socket
+from time import time
+
+
+STATE_VERSION = 1
+
+
+def machine_name():
+    """Return the name of this machine, usable as file name."""
+    return re.sub(r'[^\w.-]', '_', socket.gethostname()) or 'localhost'
+
+
+class Sync:
+
+    def __init__(self, steam, folder, machine=None):
+        self.steam = steam
+        self.folder = os.path.realpath(folder)
+        self.machine = machine or machine_name()
+        self.objects = os.path.join(self.folder, 'objects')
+        self.changes = os.path.join(self.folder, 'changes')
+        self.state_file = os.path.join(steam.acolyte_data, 'sync.json')
+
+    def run(self):
+        """Merge remote changes into steam's config, and push the local
+        changes that are newer. Must be called only while steam is not
+        running. Returns a dict with the number of ``exported``,
+        ``imported`` and ``removed`` accounts."""
+        states = self._load_state()
+        state = states.setdefault(self.folder, {})
+        # {account: [digest, time, machine]} of the last known change:
+        known = state.setdefault('accounts', {})
+        self.steam.store_users()
+        local = self._local_changes(known)
+        remote = self._pull(
+            known, state.setdefault('offsets', {}), state.get('pending', {}))
+        # The newest change wins, no matter on which machine it was made:
+        for name in set(local) & set(remote):
+            if local[name][0] == remote[name][0]:
+                del local[name]
+                known[name] = remote.pop(name)
+            elif _newer(remote[name], local[name]):
+                del local[name]
+            else:
+                del remote[name]
+        vault = self.steam.vault
+        for name, entry in list(remote.items()):
+            if entry[0] == vault.digest(name):
+                known[name] = remote.pop(name)
+        removed = sorted(name for name, (digest, *_) in remote.items()
+                         if digest is None)
+        imported = []
+        failed = {}
+        with self.steam.edits.transaction('sync with ' + self.folder):
+            if removed:
+                self.steam.remove_users(removed)
+            for name, entry in sorted(remote.items()):
+                if entry[0] is None:
+                    continue
+                if self._apply(name, entry[0]):
+                    imported.append(name)
+                else:
+                    failed[name] = entry
+        known.update((name, remote[name]) for name in removed + imported)
+        # Retry changes whose snapshots are not (completely) available yet:
+        state['pending'] = failed
+        self._push(local, known)
+        self._save_state(states)
+        return {
+            'exported': len(local),
+            'imported': len(imported),
+            'removed': len(removed),
+        }
+
+    def _local_changes(self, known):
+        """Return ``{account: [digest, time, machine]}`` of the accounts in
+        the vault that changed since the last sync."""
+        vault = self.steam.vault
+        current = set(vault.accounts())
+        changes = {}
+        for name in current:
+            digest = vault.digest(name)
+            if known.get(name, [None])[0] != digest:
+                changes[name] = [digest, self._changed(name), self.machine]
+        for name, (digest, *_) in known.items():
+            if digest is not None and name not in current:
+                changes[name] = [None, self._changed(name), self.machine]
+        for name, entry in changes.items():
+            # A local change must have followed the last known one, even if
+            # the clocks of the machines disagree:
+            if name in known and not _newer(entry, known[name]):
+                entry[1] = known[name][1] + 0.001
+        return changes
+
+    def _changed(self, name):
+        """Return when the account was changed locally. For logins, this is
+        the login time recorded by steam, rather than when the vault noticed
+        the change, so that a snapshot that has been lying around in steam's
+        config is not mistaken for a new one."""
+        vault = self.steam.vault
+        when = vault.changed(name) or time()
+        snapshot = vault.load(name)
+        try:
+            login = float(snapshot['loginusers']['Timestamp'])
+        except (TypeError, KeyError, ValueError):
+            return when
+        return min(when, login) if login > 0 else when
+
+    def _push(self, changes, known):
+        """Export the snapshots of local changes, and append the changes to
+        our change log."""
+        if not changes:
+            return
+        for digest, *_ in changes.values():
+            if digest is not None:
+                self._export_object(digest)
+        os.makedirs(self.changes, exist_ok=True)
+        text = ''.join(
+            json.dumps({'a': name, 'h': digest, 't': when},
+                       separators=(',', ':')) + '\n'
+            for name, (digest, when, _) in sorted(changes.items()))
+        with open(self._log_file(self.machine), 'ab') as f:
+            f.write(text.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        known.update(changes)
+
+    def _pull(self, known, offsets, pending):
+        """Read the changes that other machines have appended to their logs
+        since the last sync. Returns ``{account: [digest, time, machine]}``
+        of all changes (including ``pending`` ones from previous syncs)
+        that are newer than the local state."""
+        latest = dict(pending)
+        try:
+            logs = sorted(os.listdir(self.changes))
+        except FileNotFoundError:
+            logs = []
+        for filename in logs:
+            machine, ext = os.path.splitext(filename)
+            if ext != '.log' or machine == self.machine:
+                continue
+            offset = offsets.get(machine, 0)
+            with open(self._log_file(machine), 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+            # Ignore a line that is still being written:
+            data = data[:data.rfind(b'\n') + 1]
+            offsets[machine] = offset + len(data)
+            for line in data.decode('utf-8').splitlines():
+                try:
+                    change = json.loads(line)
+                    entry = [change['h'], change['t'], machine]
+                    name = change['a']
+                except (ValueError, KeyError):
+                    continue
+                if _newer(entry, latest.get(name)):
+                    latest[name] = entry
+        return {
+            name: entry for name, entry in latest.items()
+            if _newer(entry, known.get(name))
+        }
+
+    def _apply(self, name, digest):
+        """Store a snapshot from the shared folder in the vault, and write its
+        entries to steam's config. Returns false if the snapshot is missing
+        or incomplete."""
+        text = read_file(os.path.join(self.objects, digest))
+        if hashlib.sha1(text.encode('utf-8')).hexdigest() != digest:
+            return False
+        snapshot = json.loads(text)
+        self.steam.vault.store(name, snapshot)
+        self.steam.apply_snapshot(
+            snapshot['loginusers'].get('AccountName', name), snapshot)
+        return True
+
+    def _export_object(self, digest):
+        target = os.path.join(self.objects, digest)
+        if os.path.exists(target):
+            return
+        os.makedirs(self.objects, exist_ok=True)
+        write_file_atomic(target, read_file(
+            os.path.join(self.steam.vault.objects, digest)))
+
+    def _log_file(self, machine):
+        return os.path.join(self.changes, machine + '.log')
+
+    def _load_state(self):
+        try:
+            data = json.loads(read_file(self.state_file) or '{}')
+        except ValueError:
+            return {}
+        if data.get('version') != STATE_VERSION:
+            return {}
+        return data['folders']
+
+    def _save_state(self, states):
+        write_file_atomic(self.state_file, json.dumps({
+            'version': STATE_VERSION,
+            'folders': states,
+        }, separators=(',', ':')))
+
+
+def _newer(entry, other):
+    """Compare changes ``[digest, time, machine]`` by time. Ties are broken
+    by machine name, so that all machines make the same decision."""
+    return other is None or (entry[1], entry[2]) > (other[1], other[2])
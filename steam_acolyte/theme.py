@@ -1,4 +1,5 @@
-from PyQt5.QtGui import QIcon
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QIcon, QImage, QPainter, QPixmap
 
 try:
     from importlib.resources import read_text, path
@@ -9,17 +10,55 @@ import os
 from types import SimpleNamespace
 
 
-def load_theme():
+# Icons that are used as fixed size pixmaps:
+PIXMAPS = {
+    'user_icon': ('user.svg', 32, 32),
+    'plus_icon': ('plus.svg', 32, 32),
+}
+
+
+def load_theme(images=None):
+    """Load theme. ``images`` can be passed to use the result of a previous
+    ``render_icons()`` call rather than rasterizing the icons here."""
+    if images is None:
+        pixmaps = {
+            key: load_icon_resource(*args)
+            for key, args in PIXMAPS.items()
+        }
+    else:
+        pixmaps = {
+            key: image and QPixmap.fromImage(image)
+            for key, image in images.items()
+        }
     return SimpleNamespace(
         window_style = read_text(__package__, 'window.css'),
         window_icon = load_icon_resource('acolyte.svg'),
         logout_icon = load_icon_resource('logout.svg'),
         delete_icon = load_icon_resource('delete.svg'),
-        user_icon = load_icon_resource('user.svg', 32, 32),
-        plus_icon = load_icon_resource('plus.svg', 32, 32),
+        **pixmaps
     )
 
 
+def render_icons():
+    """Rasterize the fixed size icons to ``QImage``. Contrary to
+    ``load_theme()``, this can be called from a worker thread."""
+    from PyQt5.QtSvg import QSvgRenderer
+    images = {}
+    for key, (name, width, height) in PIXMAPS.items():
+        with path(__package__, name) as p:
+            renderer = QSvgRenderer(str(p))
+        if not renderer.isValid():
+            images[key] = None
+            continue
+        image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+        painter = QPainter(image)
+        renderer.render(painter)
+        painter.end()
+        images[key] = image
+    return images
+
+
 def load_icon_file(filename, *size):
     if os.path.isfile(filename):
         icon = QIcon(filename)
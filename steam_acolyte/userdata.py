@@ -0,0 +1,247 @@
+"""
+Disk usage and cleanup of the per-account ``userdata`` folders.
+
+Steam keeps settings, screenshots and cloud saves of each account that has
+logged in on this machine in ``<root>/userdata/<accountid>``, where the
+account ID is the lower part of the 64 bit steam ID.
+
+The disk usage is computed by walking the folders in parallel. For every
+directory, the total size of its files and the list of its subdirectories
+are cached along with its mtime, so that only changed directories have to
+be listed again. Note that files modified in place don't change the mtime
+of their directory, so their new size is only picked up once something else
+in the same directory changes.
+
+Userdata of removed accounts is first moved to a trash folder (which is
+fast and frees the name for steam), and then deleted in a low priority
+background thread. If the trash is on a different file system, the folder
+is renamed within userdata instead. Folders are never deleted by their
+original path, which may be in use again by then.
+
+This module must not import Qt.
+"""
+
+from .util import read_file, write_file_atomic, lower_thread_priority
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import threading
+from time import time
+
+
+STEAM_ID_BASE = 76561197960265728
+CACHE_VERSION = 1
+
+# Prefix of folders in userdata that are waiting to be deleted, if they
+# can't be moved to the trash:
+TRASH_PREFIX = '.trash-'
+
+
+def account_id(steam_id):
+    """Return the account ID (name of the userdata folder) for a 64 bit
+    steam ID."""
+    return str(int(steam_id) - STEAM_ID_BASE)
+
+
+def steam_id(account_id):
+    """Return the 64 bit steam ID for an account ID."""
+    return str(int(account_id) + STEAM_ID_BASE)
+
+
+class DiskUsage:
+
+    def __init__(self, root, cache_file):
+        self.folder = os.path.join(root, 'userdata')
+        self.cache_file = cache_file
+        self._cache = None
+
+    def usage(self):
+        """Return dict ``{account_id: bytes}`` for all userdata folders."""
+        if self._cache is None:
+            self._cache = self._load_cache()
+        try:
+            with os.scandir(self.folder) as entries:
+                ids = [e.name for e in entries
+                       if e.name.isdigit() and e.is_dir()]
+        except FileNotFoundError:
+            ids = []
+        old = self._cache
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(
+                lambda name: self._walk(
+                    os.path.join(self.folder, name), old), ids))
+        cache = {}
+        usage = {}
+        for name, (total, dirs) in zip(ids, results):
+            usage[name] = total
+            cache.update(dirs)
+        if cache != self._cache:
+            self._cache = cache
+            self._save_cache()
+        return usage
+
+    def _walk(self, path, old):
+        """Return total size below path and the cache entries for all
+        directories below."""
+        dirs = {}
+        total = 0
+        stack = [path]
+        while stack:
+            path = stack.pop()
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            cached = old.get(path)
+            if cached is None or cached[0] != mtime:
+                cached = [mtime, 0, []]
+                try:
+                    with os.scandir(path) as entries:
+                        for entry in entries:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    cached[2].append(entry.name)
+                                else:
+                                    cached[1] += entry.stat(
+                                        follow_symlinks=False).st_size
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+            dirs[path] = cached
+            total += cached[1]
+            stack.extend(os.path.join(path, name) for name in cached[2])
+        return total, dirs
+
+    def _load_cache(self):
+        try:
+            data = json.loads(read_file(self.cache_file) or '{}')
+        except ValueError:
+            return {}
+        if data.get('version') != CACHE_VERSION:
+            return {}
+        return data['dirs']
+
+    def _save_cache(self):
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        write_file_atomic(self.cache_file, json.dumps({
+            'version': CACHE_VERSION,
+            'dirs': self._cache,
+        }, separators=(',', ':')))
+
+
+def move_to_trash(root, trash, steam_ids):
+    """Move the userdata folders of the given accounts into the trash folder.
+    Returns the number of folders moved."""
+    moved = 0
+    for sid in steam_ids:
+        src = os.path.join(root, 'userdata', account_id(sid))
+        if not os.path.isdir(src):
+            continue
+        os.makedirs(trash, exist_ok=True)
+        name = '{}-{}'.format(account_id(sid), int(time() * 1000))
+        try:
+            os.rename(src, os.path.join(trash, name))
+        except OSError:
+            # e.g. userdata is on a different file system. Move it out of
+            # the way within userdata, so that a new login of the account
+            # starts with a fresh folder that is not deleted by the purger:
+            dest = os.path.join(root, 'userdata', TRASH_PREFIX + name)
+            os.rename(src, dest)
+            with open(os.path.join(trash, 'pending'), 'a') as f:
+                f.write(dest + '\n')
+        moved += 1
+    return moved
+
+
+class Purger:
+
+    """Background thread that deletes everything in the trash folder. Calls
+    ``progress(done, total)`` (in bytes) from the worker thread, and
+    ``progress(total, total)`` at the end."""
+
+    def __init__(self, trash, progress=None):
+        self.trash = trash
+        self.progress = progress or (lambda done, total: None)
+        self.done = 0
+        self.total = 0
+        self._thread = threading.Thread(
+            target=self._run, name='purge', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def join(self):
+        self._thread.join()
+
+    def is_running(self):
+        return self._thread.is_alive()
+
+    def _targets(self):
+        # Take the list of folders that were moved out of the way, so that
+        # folders that are added to it while purging are not forgotten:
+        pending = os.path.join(self.trash, 'pending')
+        try:
+            os.rename(pending, '{}.{}'.format(pending, int(time() * 1000)))
+        except FileNotFoundError:
+            pass
+        lists = [e.path for e in os.scandir(self.trash)
+                 if e.name.startswith('pending.')]
+        targets = [e.path for e in os.scandir(self.trash)
+                   if not e.name.startswith('pending')]
+        # Never delete anything but folders that were moved out of the way:
+        targets += [path for name in lists
+                    for path in read_file(name).splitlines()
+                    if os.path.basename(path).startswith(TRASH_PREFIX)]
+        return targets, lists
+
+    def _run(self):
+        lower_thread_priority()
+        try:
+            targets, lists = self._targets()
+        except FileNotFoundError:
+            return
+        files = []
+        dirs = []
+        for target in targets:
+            # os.walk() yields nothing for files, and follows links:
+            if os.path.islink(target) or not os.path.isdir(target):
+                try:
+                    files.append((target, os.lstat(target).st_size))
+                except OSError:
+                    pass
+                continue
+            for path, subdirs, names in os.walk(target, topdown=False):
+                links = [d for d in subdirs
+                         if os.path.islink(os.path.join(path, d))]
+                for name in names + links:
+                    name = os.path.join(path, name)
+                    try:
+                        files.append((name, os.lstat(name).st_size))
+                    except OSError:
+                        continue
+                dirs.append(path)
+        self.total = sum(size for _, size in files)
+        last = time()
+        for name, size in files:
+            try:
+                os.unlink(name)
+            except OSError:
+                pass
+            self.done += size
+            if self.done < self.total and time() - last > 0.2:
+                last = time()
+                self.progress(self.done, self.total)
+        for path in dirs:
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+        for name in lists:
+            try:
+                os.unlink(name)
+            except FileNotFoundError:
+                pass
+        self.progress(self.total, self.total)
@@ -2,6 +2,8 @@ import os
 import re
 import shlex
 import shutil
+import sys
+import tempfile
 import logging
 from steam_acolyte.funcwrap import wraps
 
@@ -41,6 +43,56 @@ def write_file(filename, text):
         f.write(text.encode('utf-8'))
 
 
+def read_binary(filename):
+    """Read full contents of given file as bytes."""
+    try:
+        with open(filename, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return b''
+
+
+def patch_file(filename, data, offset):
+    """Replace file contents with ``data``, assuming that only bytes starting
+    from ``offset`` have changed. Only the changed tail is written, and
+    synced to disk."""
+    try:
+        f = open(filename, 'r+b')
+    except FileNotFoundError:
+        f, offset = open(filename, 'wb'), 0
+    with f:
+        f.seek(offset)
+        f.write(data[offset:])
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_file_atomic(filename, text):
+    """Write file with the given text by replacing it with a temporary file,
+    so that concurrent readers never see partial contents."""
+    dirname, basename = os.path.split(filename)
+    fd, tmp = tempfile.mkstemp(prefix=basename + '.', dir=dirname)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(text.encode('utf-8'))
+        os.replace(tmp, filename)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def lower_thread_priority():
+    """Run the calling thread with the lowest CPU and I/O priority. Only
+    implemented on linux, where niceness is a per-thread attribute and the
+    default I/O priority is derived from it."""
+    if sys.platform.startswith('linux'):
+        try:
+            os.nice(19)
+        except OSError:
+            pass
+
+
 def join_args(args):
     """Compose command line from argument list."""
     return ' '.join(map(shlex.quote, args))
@@ -0,0 +1,115 @@
+"""
+Content-addressed storage of per-user login snapshots.
+
+A snapshot contains everything that steam needs to login a user without
+asking for the password: the user's record in ``loginusers.vdf``, as well as
+the ``Accounts`` and ``ConnectCache`` entries in ``config.vdf``. Snapshots
+are stored as objects named by the hash of their contents, so storing an
+unchanged snapshot costs nothing but a hash computation. The ``refs``
+folder maps account names to their current snapshot. The ``removed`` folder
+records when users were removed, by the mtime of an empty file per user.
+The mtimes of refs and these files tell when an account last changed.
+"""
+
+from .util import read_file, write_file_atomic
+
+import hashlib
+import json
+import os
+import zlib
+from urllib.parse import quote, unquote
+
+
+def connect_cache_key(account_name):
+    """Return the key of the user's login token in the ``ConnectCache``
+    section of ``config.vdf``."""
+    return '{:x}1'.format(zlib.crc32(account_name.encode('utf-8')))
+
+
+class Vault:
+
+    def __init__(self, path):
+        self.path = path
+        self.objects = os.path.join(path, 'objects')
+        self.refs = os.path.join(path, 'refs')
+        self.removed = os.path.join(path, 'removed')
+
+    def store(self, account_name, snapshot):
+        """Store snapshot for the given user. Returns true if the snapshot
+        differs from the previously stored one."""
+        text = json.dumps(snapshot, sort_keys=True, separators=(',', ':'))
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        ref = self._ref_file(account_name)
+        if read_file(ref) == digest:
+            return False
+        obj = os.path.join(self.objects, digest)
+        if not os.path.exists(obj):
+            os.makedirs(self.objects, exist_ok=True)
+            write_file_atomic(obj, text)
+        os.makedirs(self.refs, exist_ok=True)
+        write_file_atomic(ref, digest)
+        try:
+            os.remove(self._removed_file(account_name))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def load(self, account_name):
+        """Return the stored snapshot for the given user, or ``None``."""
+        digest = read_file(self._ref_file(account_name))
+        text = digest and read_file(os.path.join(self.objects, digest))
+        return json.loads(text) if text else None
+
+    def digest(self, account_name):
+        """Return the hash of the user's snapshot, or ``None``."""
+        return read_file(self._ref_file(account_name)) or None
+
+    def remove(self, account_name):
+        """Forget the snapshot of the given user."""
+        try:
+            os.remove(self._ref_file(account_name))
+        except FileNotFoundError:
+            return
+        os.makedirs(self.removed, exist_ok=True)
+        write_file_atomic(self._removed_file(account_name), '')
+
+    def changed(self, account_name):
+        """Return the time when the user's snapshot was last stored or
+        removed, or ``None`` if unknown."""
+        for filename in (self._ref_file(account_name),
+                         self._removed_file(account_name)):
+            try:
+                return os.stat(filename).st_mtime
+            except FileNotFoundError:
+                continue
+        return None
+
+    def accounts(self):
+        """Return names of all users with a stored snapshot."""
+        try:
+            return [unquote(name) for name in os.listdir(self.refs)]
+        except FileNotFoundError:
+            return []
+
+    def prune(self):
+        """Delete objects that are no longer referenced."""
+        used = {read_file(self._ref_file(name)) for name in self.accounts()}
+        try:
+            objects = os.listdir(self.objects)
+        except FileNotFoundError:
+            return
+        for digest in objects:
+            if digest not in used:
+                os.remove(os.path.join(self.objects, digest))
+
+    def _ref_file(self, account_name):
+        return os.path.join(self.refs, _quote(account_name))
+
+    def _removed_file(self, account_name):
+        return os.path.join(self.removed, _quote(account_name))
+
+
+# Account names are restricted to [a-zA-Z0-9_] by steam, but let's not
+# trust this for the purpose of creating file names:
+def _quote(name):
+    return quote(name.lower(), safe='')
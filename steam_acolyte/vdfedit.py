@@ -0,0 +1,137 @@
+"""
+Locate and replace individual entries in the text of a .vdf file.
+
+This allows to modify a single entry without parsing and serializing the
+whole document. All offsets refer to the UTF-8 encoded file contents.
+"""
+
+import vdf
+
+from collections import namedtuple
+import re
+
+
+# Tokens are either skipped (whitespace, comments, conditionals), strings
+# (quoted or unquoted), or braces:
+_TOKEN = re.compile(rb'''
+    (?P<skip> \s+ | //[^\n]* | \[[^\]\n]*\] )
+  | (?P<str>  "(?:[^"\\]|\\.)*" | [^\s{}"]+ )
+  | (?P<open> \{ )
+  | (?P<close> \} )
+''', re.X | re.S)
+
+_UNESCAPE = re.compile(rb'\\(.)', re.S)
+
+
+# `start` and `end` delimit the whole entry, `value` is the start of the
+# value token (the opening brace for nested objects):
+Entry = namedtuple('Entry', ['key', 'start', 'value', 'end'])
+
+
+def _next_token(data, pos, end):
+    """Return ``(kind, start, end)`` of the next significant token."""
+    while pos < end:
+        match = _TOKEN.match(data, pos, end)
+        if match is None:
+            return None
+        if match.lastgroup != 'skip':
+            return match.lastgroup, match.start(), match.end()
+        pos = match.end()
+    return None
+
+
+def _decode_key(token):
+    if token.startswith(b'"'):
+        token = _UNESCAPE.sub(rb'\1', token[1:-1])
+    return token.decode('utf-8', errors='replace')
+
+
+def entries(data, start=0, end=None):
+    """Iterate over the entries directly contained in ``data[start:end]``,
+    skipping over the contents of nested objects."""
+    end = len(data) if end is None else end
+    pos = start
+    while True:
+        tok = _next_token(data, pos, end)
+        if tok is None or tok[0] != 'str':
+            return
+        key = _decode_key(data[tok[1]:tok[2]])
+        val = _next_token(data, tok[2], end)
+        if val is None or val[0] == 'close':
+            return
+        pos = val[2]
+        if val[0] == 'open':
+            depth = 1
+            while depth:
+                sub = _next_token(data, pos, end)
+                if sub is None:
+                    return
+                depth += {'open': 1, 'close': -1}.get(sub[0], 0)
+                pos = sub[2]
+        yield Entry(key, tok[1], val[1], pos)
+
+
+def lookup(data, path):
+    """Return the ``Entry`` at the given '\\' separated path (compared
+    case-insensitively), or ``None`` if it does not exist."""
+    entry = None
+    start, end = 0, len(data)
+    for name in path.split('\\'):
+        if entry is not None:
+            if not is_object(data, entry):
+                return None
+            start, end = entry.value + 1, entry.end - 1
+        name = name.lower()
+        entry = next((e for e in entries(data, start, end)
+                      if e.key.lower() == name), None)
+        if entry is None:
+            return None
+    return entry
+
+
+def is_object(data, entry):
+    """Check whether the entry's value is a nested object."""
+    return data[entry.value:entry.value + 1] == b'{'
+
+
+def parse_value(data, entry):
+    """Parse the value of an entry, i.e. return a string or a dict."""
+    text = data[entry.start:entry.end].decode('utf-8', errors='replace')
+    return next(iter(vdf.loads(text).values()), None)
+
+
+def format_entry(key, value, depth):
+    """Serialize a single entry indented to the given nesting depth."""
+    text = vdf.dumps({key: value}, pretty=True)
+    indent = '\t' * depth
+    return ''.join(indent + line for line in text.splitlines(True))
+
+
+def set_entry(data, path, key, value):
+    """Replace or insert the entry ``key`` in the object at ``path``. Missing
+    parent objects are created. Returns ``(data, offset)`` where ``offset``
+    is the position of the first modified byte."""
+    names = path.split('\\') if path else []
+    if names:
+        parent = lookup(data, path)
+        if parent is None:
+            *head, last = names
+            return set_entry(data, '\\'.join(head), last, {key: value})
+        start, end = parent.value + 1, parent.end - 1
+    else:
+        start, end = 0, len(data)
+    old = next((e for e in entries(data, start, end)
+                if e.key.lower() == key.lower()), None)
+    key = key if old is None else old.key
+    text = format_entry(key, value, len(names)).encode('utf-8')
+    if old is not None:
+        # Replace the entry in place, keeping the surrounding whitespace:
+        text = text.strip()
+        return data[:old.start] + text + data[old.end:], old.start
+    # Insert a new entry at the start of the line of the closing brace:
+    pos = data.rfind(b'\n', start, end) + 1 if names else end
+    if pos == 0 and names or data[pos:end].strip():
+        pos, text = end, b'\n' + text
+    elif not names and data and not data.endswith(b'\n'):
+        text = b'\n' + text
+    return data[:pos] + text + data[pos:], pos
@@ -1,14 +1,17 @@
 from steam_acolyte.steam import SteamUser
+from steam_acolyte.accounts import AccountIndex, AccountFilter
 from steam_acolyte.async_ import AsyncTask
 from steam_acolyte.util import Tracer
+from steam_acolyte import profiling
 
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QIcon
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtGui import QIcon, QKeySequence
 from PyQt5.QtWidgets import (
     QDialog, QLabel, QToolButton, QAbstractButton,
     QAction, QHBoxLayout, QVBoxLayout, QSizePolicy,
     QStyle, QStyleOption, QStylePainter, QWidget,
-    QSystemTrayIcon, QMenu, QApplication, QScrollArea)
+    QSystemTrayIcon, QMenu, QApplication, QScrollArea, QLineEdit,
+    QWidgetAction)
 
 
 try:                        # PyQt >= 5.11
@@ -19,25 +22,58 @@ except AttributeError:      # PyQt < 5.11
 
 trace = Tracer(__name__)
 
+TRAY_TOOLTIP = "acolyte - lightweight steam account manager"
+
+MILESTONE_LABELS = {
+    'started': "started",
+    'ipc': "ready",
+    'login': "logged in",
+    'ui': "shown",
+}
+
 
 class LoginDialog(QDialog):
 
-    def __init__(self, steam, theme):
+    users_loaded = pyqtSignal(object)
+    purge_progress = pyqtSignal('qint64', 'qint64')
+
+    def __init__(self, steam, theme, users=None, mru=False, prefetch=0,
+                 purge=False):
         super().__init__()
         self.steam = steam
         self.theme = theme
+        self.mru = mru
+        self.prefetch = prefetch
+        self.prefetcher = None
+        self.purge = purge
+        self.purger = None
+        self._purge_again = False
         self.trayicon = None
         self.wait_task = None
+        self.hooks_task = None
+        self.refresh_task = None
         self.process = None
         self._exit = False
         self._login = None
-        self.user_widgets = []
+        self._login_args = None
+        self.apps = []
+        self.apps_task = None
+        self.user_widgets = {}
+        self.new_user_widget = None
+        self.user_filter = AccountFilter(AccountIndex())
+        self.filter_edit = QLineEdit(self)
+        self.filter_edit.setPlaceholderText("Filter users…")
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.textChanged.connect(self.apply_filter)
+        self.filter_edit.returnPressed.connect(self.login_filtered)
+        self.filter_edit.hide()
         self.userlist = UserListWidget()
         self.userlist.setLayout(QVBoxLayout())
         scroll = QScrollArea(self)
         scroll.setWidgetResizable(True)
         scroll.setWidget(self.userlist)
         self.setLayout(QVBoxLayout())
+        self.layout().addWidget(self.filter_edit)
         self.layout().addWidget(scroll)
         self.layout().setContentsMargins(0, 0, 0, 0)
 
@@ -46,28 +82,204 @@ class LoginDialog(QDialog):
         self.setStyleSheet(theme.window_style)
 
         steam.command_received.connect(lambda *_: self.activateWindow())
-        self.update_userlist()
+        steam.pipe_held.connect(self.show_blocking_processes)
+        steam.milestone.connect(self.show_milestone)
+
+        delete = QAction(self)
+        delete.setShortcut(QKeySequence.Delete)
+        delete.triggered.connect(self.delete_selected)
+        self.addAction(delete)
+
+        # Paint immediately from the account snapshot (if any), and apply
+        # the actual state from steam's config files when it becomes
+        # available. `users` may be passed as a `concurrent.futures.Future`
+        # if the config is already being read by another thread:
+        self.refresh_apps()
+        self.purge_progress.connect(self._on_purge_progress)
+        if purge:
+            # Continue deleting leftovers of a previous session:
+            self.start_purge()
+        self.users_loaded.connect(self._on_users_loaded)
+        if users is not None and users.done():
+            self.update_userlist(users.result())
+            return
+        cached = steam.cached_users()
+        if cached is None and users is None:
+            self.update_userlist()
+            return
+        self.update_userlist(cached or AccountIndex())
+        if users is None:
+            self.refresh_userlist()
+        else:
+            users.add_done_callback(self.users_loaded.emit)
+
+    def refresh_userlist(self):
+        """Reread the user list in a background thread, and update the user
+        list widget when finished."""
+        self.refresh_task = AsyncTask(self.steam.users)
+        self.refresh_task.finished.connect(self._on_refreshed)
+        self.refresh_task.start()
+
+    def refresh_apps(self):
+        """Rescan the installed apps in a background thread."""
+        if self.apps_task is not None:
+            return
+        self.apps_task = AsyncTask(self.steam.installed_apps)
+        self.apps_task.finished.connect(self._on_apps_refreshed)
+        self.apps_task.start()
+
+    def _on_apps_refreshed(self):
+        apps = self.apps_task.result or []
+        self.apps_task = None
+        if apps != self.apps:
+            self.apps = apps
+            self.menuOrder = None       # recreate tray menu entries
+
+    def _on_refreshed(self):
+        users = self.refresh_task.result
+        self.refresh_task = None
+        self.update_userlist(users)
+
+    def _on_users_loaded(self, future):
+        """Update user list from a finished future. Falls back to reading the
+        config again in the main thread if the future failed."""
+        try:
+            users = future.result()
+        except Exception:
+            users = None
+        self.update_userlist(users)
+
+    def update_userlist(self, users=None):
+        """Update the user list widget from the config file, or from the given
+        list of users. Widgets for unchanged users are kept as they are."""
+        if users is None:
+            users = self.steam.users()
+        widgets = {}
+        for user in self.ordered(users):
+            widget = self.user_widgets.pop(user.steam_id, None)
+            if widget is not None and not widget.shows(user):
+                self.userlist.layout().removeWidget(widget)
+                widget.deleteLater()
+                widget = None
+            if widget is None:
+                widget = UserWidget(self, user)
+            widget.user = user
+            widgets[user.steam_id] = widget
+        for widget in self.user_widgets.values():
+            self.userlist.layout().removeWidget(widget)
+            widget.deleteLater()
+        if self.new_user_widget is None:
+            self.new_user_widget = UserWidget(self, SteamUser('', '', '', ''))
+        self.user_widgets = widgets
+        self.arrange_widgets(
+            list(widgets.values()) + [self.new_user_widget])
+        self.user_filter = AccountFilter(users)
+        self.apply_filter(self.filter_edit.text())
+        profiling.checkpoint('userlist')
+
+    def apply_filter(self, text):
+        """Show only users that match the filter text. Widgets are hidden
+        rather than removed, so they don't have to be recreated."""
+        matches = {u.steam_id for u in self.user_filter.update(text)}
+        for steam_id, widget in self.user_widgets.items():
+            widget.setVisible(steam_id in matches)
+        self.new_user_widget.setVisible(not text.strip())
+        if not text and self.filter_edit.isVisible():
+            self.filter_edit.hide()
+            self.setFocus()
+
+    def login_filtered(self):
+        """Login the user if the filter matches exactly one."""
+        matches = self.user_filter.matches
+        if len(matches) == 1:
+            self.login(matches[0].account_name)
+
+    def keyPressEvent(self, event):
+        """Start filtering the user list when the user starts typing."""
+        text = event.text()
+        modifiers = event.modifiers() & (Qt.ControlModifier | Qt.AltModifier)
+        if event.key() == Qt.Key_Escape and self.filter_edit.text():
+            self.filter_edit.clear()
+        elif text and text.isprintable() and not modifiers:
+            self.filter_edit.show()
+            self.filter_edit.setFocus()
+            self.filter_edit.insert(text)
+        else:
+            super().keyPressEvent(event)
+
+    def ordered(self, users):
+        """Return users from an ``AccountIndex`` in display order."""
+        if not self.mru:
+            return users
+        return users.ordered(
+            'mru', self.sort_key, self.steam.journal.generation)
+
+    def sort_key(self, user):
+        """Return key for the display order of users: either alphabetical,
+        or by most recent use as known from acolyte's session journal or
+        steam's login timestamp."""
+        if not self.mru:
+            return user.sort_key
+        last_used = self.steam.journal.last_used(user.account_name) or 0
+        try:
+            last_login = int(user.timestamp)
+        except ValueError:
+            last_login = 0
+        return (-max(last_used, last_login), user.sort_key)
+
+    def selected_widgets(self):
+        """Return list of user widgets selected via Ctrl+Click."""
+        return [w for w in self.user_widgets.values()
+                if w.selected and w.isVisible()]
+
+    def delete_selected(self):
+        """Remove all selected users."""
+        self.delete_users(self.selected_widgets())
+
+    def delete_users(self, widgets):
+        """Remove the users of the given widgets from the list. Steam's config
+        files are written only once."""
+        self.steam.remove_users(
+            [w.user.account_name for w in widgets], purge=self.purge)
+        if self.purge:
+            self.start_purge()
+        for widget in widgets:
+            widget.set_selected(False)
+            widget.hide()
+            self.userlist.layout().removeWidget(widget)
+            self.user_widgets.pop(widget.user.steam_id, None)
+            widget.deleteLater()
+        self.adjustSize()
+
+    def start_purge(self):
+        """Delete userdata of removed users in the background."""
+        if self.purger is not None and self.purger.is_running():
+            self._purge_again = True
+            return
+        self._purge_again = False
+        self.purger = self.steam.purge_trash(self.purge_progress.emit)
+
+    def _on_purge_progress(self, done, total):
+        """Show progress of the userdata deletion in the window title."""
+        if done < total:
+            self.setWindowTitle("Steam Acolyte - deleting userdata {}%".format(
+                100 * done // total))
+            return
+        self.setWindowTitle("Steam Acolyte")
+        self.purger = None
+        if self._purge_again:
+            self.start_purge()
 
-    def update_userlist(self):
-        """Update the user list widget from the config file."""
-        self.clear_layout()
-        users = sorted(self.steam.users(), key=lambda u:
-                       (u.persona_name.lower(), u.account_name.lower()))
-        users.append(SteamUser('', '', '', ''))
-        for user in users:
-            self.userlist.layout().addWidget(UserWidget(self, user))
-
-    def clear_layout(self):
-        """Remove all users from the user list widget."""
-        # The safest way I found to clear a QLayout is to reparent it to a
-        # temporary widget. This also recursively reparents, hides and later
-        # destroys any child widgets.
+    def arrange_widgets(self, widgets):
+        """Set order of widgets in the user list layout."""
         layout = self.userlist.layout()
-        if layout is not None:
-            dump = QWidget()
-            dump.setLayout(layout)
-            dump.deleteLater()
-        self.userlist.setLayout(QVBoxLayout())
+        current = [layout.itemAt(i).widget() for i in range(layout.count())]
+        if current == widgets:
+            return
+        for widget in current:
+            layout.removeWidget(widget)
+        for widget in widgets:
+            layout.addWidget(widget)
 
     @trace.method
     def wait_for_lock(self):
@@ -90,10 +302,21 @@ class LoginDialog(QDialog):
             return
         self.stopAction.setEnabled(False)
         self.wait_task = None
+        self.stop_prefetch()
+        if self.trayicon is not None:
+            self.trayicon.setToolTip(TRAY_TOOLTIP)
+        if self.process is not None:
+            self.steam.hooks.start(
+                'post-exit', ACOLYTE_USER=self.steam.get_last_user(),
+                ACOLYTE_EXIT_CODE=self.process.exitCode())
+            self.process = None
+        profiling.checkpoint('session')
+        self.steam.store_users()
         self.update_userlist()
+        self.refresh_apps()
         if self._login:
-            self.run_steam(self._login)
-            self._login = None
+            username, self._login = self._login, None
+            self.run_steam(username, self._login_args)
             return
         self.show()
 
@@ -107,8 +330,7 @@ class LoginDialog(QDialog):
         icon = QIcon(self.theme.window_icon.pixmap(64))
         self.trayicon = QSystemTrayIcon(icon)
         self.trayicon.setVisible(True)
-        self.trayicon.setToolTip(
-            "acolyte - lightweight steam account manager")
+        self.trayicon.setToolTip(TRAY_TOOLTIP)
         self.trayicon.activated.connect(self.trayicon_clicked)
         self.trayicon.setContextMenu(self.createMenu())
 
@@ -142,11 +364,25 @@ class LoginDialog(QDialog):
 
         self.newUserAction = make_user_action(
             self, SteamUser('', '', '', ''))
-        self.userActions = []
+        self.userActions = {}
+        self.menuOrder = None
+        self.menuFilter = AccountFilter(AccountIndex())
+        self.menuFilterEdit = QLineEdit()
+        self.menuFilterEdit.setPlaceholderText("Filter users…")
+        self.menuFilterEdit.textChanged.connect(self.filter_menu)
+        self.menuFilterEdit.returnPressed.connect(self.login_menu_filtered)
+        search = QWidgetAction(self)
+        search.setDefaultWidget(self.menuFilterEdit)
         menu = QMenu()
         menu.addSection('Login')
+        menu.addAction(search)
         menu.addAction(self.newUserAction)
         menu.addSeparator()
+        if profiling.enabled():
+            dump = QAction('&Dump profile', self)
+            dump.setToolTip('Save profiling data collected so far.')
+            dump.triggered.connect(profiling.dump)
+            menu.addAction(dump)
         menu.addAction(stop)
         menu.addAction(exit)
         menu.aboutToShow.connect(self.update_menu, QueuedConnection)
@@ -159,14 +395,38 @@ class LoginDialog(QDialog):
         self.position_menu()
 
     def populate_menu(self):
-        """Update user list menuitems in tray menu."""
+        """Update user list menuitems in tray menu. The actions are only
+        recreated if the user list has changed."""
         menu = self.trayicon.contextMenu()
-        for action in self.userActions:
-            menu.removeAction(action)
-        users = sorted(self.steam.users(), key=lambda u:
-                       (u.persona_name.lower(), u.account_name.lower()))
-        self.userActions = [make_user_action(self, user) for user in users]
-        menu.insertActions(self.newUserAction, self.userActions)
+        users = self.steam.users()
+        order = self.ordered(users)
+        if order is not self.menuOrder:
+            for action in self.userActions.values():
+                menu.removeAction(action)
+            self.userActions = {
+                user.steam_id: make_user_action(self, user)
+                for user in order}
+            menu.insertActions(
+                self.newUserAction, list(self.userActions.values()))
+            self.menuOrder = order
+            self.menuFilter = AccountFilter(users)
+        self.menuFilterEdit.clear()
+        self.filter_menu('')
+        self.menuFilterEdit.setFocus()
+
+    def filter_menu(self, text):
+        """Show only the menu entries for users that match the text."""
+        matches = {u.steam_id for u in self.menuFilter.update(text)}
+        for steam_id, action in self.userActions.items():
+            action.setVisible(steam_id in matches)
+        self.newUserAction.setVisible(not text.strip())
+
+    def login_menu_filtered(self):
+        """Login the user if the menu filter matches exactly one."""
+        matches = self.menuFilter.matches
+        if len(matches) == 1:
+            self.trayicon.contextMenu().close()
+            self.login(matches[0].account_name)
 
     def position_menu(self):
         """Set menu position from tray icon."""
@@ -216,29 +476,94 @@ class LoginDialog(QDialog):
             self.steam.release_acolyte_instance_lock()
 
     @trace.method
-    def login(self, username):
+    def login(self, username, args=None):
         """
         Exit steam if open, and login the user with the given username.
+        Optionally, pass the given command line arguments to steam.
         """
         if self.steam.has_steam_lock():
-            self.run_steam(username)
+            self.run_steam(username, args)
         else:
             self._login = username
+            self._login_args = args
             self.exit_steam()
+            self.stop_prefetch()
+            self.prefetcher = self.steam.prefetch(self.prefetch)
+
+    def stop_prefetch(self):
+        """Stop reading ahead, so as not to compete with steam's own I/O once
+        it is started."""
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+            if self.trayicon is not None and self.prefetcher.bytes:
+                self.trayicon.setToolTip(
+                    "acolyte - " + self.prefetcher.summary())
+            self.prefetcher = None
+
+    def cancel_hooks(self):
+        """Kill running hooks, so that they don't delay exiting."""
+        self.steam.hooks.shutdown()
+        if self.hooks_task is not None:
+            self.hooks_task.wait()
 
     @trace.method
-    def run_steam(self, username):
-        """Run steam as the given user."""
+    def run_steam(self, username, args=None):
+        """Run steam as the given user, after the pre-launch hooks have
+        finished or exceeded their budget. A login that is requested while
+        the hooks are running is started after them instead."""
+        if self.hooks_task is not None:
+            self._login = username
+            self._login_args = args
+            return
         # Close and recreate after steam is finished. This serves two purposes:
         # 1. update user list and widget state
         # 2. fix ":hover" selector not working on linux after hide+show
         self.hide()
         self.steam.switch_user(username)
+        self.steam.hooks.start('pre-launch', ACOLYTE_USER=username)
+        if self.steam.hooks.busy():
+            self.hooks_task = AsyncTask(self.steam.hooks.wait)
+            self.hooks_task.finished.connect(lambda: self._launch_steam(args))
+            self.hooks_task.start()
+        else:
+            self._launch_steam(args)
+
+    @trace.method
+    def _launch_steam(self, args=None):
+        self.hooks_task = None
+        if self._login:
+            username, self._login = self._login, None
+            self.run_steam(username, self._login_args)
+            return
+        self.stop_prefetch()
         self.steam.unlock()
         self.stopAction.setEnabled(True)
-        self.process = self.steam.run()
+        self.process = self.steam.run(args)
         self.process.finished.connect(self.wait_for_lock)
 
+    @trace.method
+    def show_blocking_processes(self, holders):
+        """Show which processes keep us from starting steam."""
+        if self.trayicon is None:
+            return
+        if not holders:
+            self.trayicon.setToolTip(TRAY_TOOLTIP)
+            return
+        names = ", ".join(sorted({h.name for h in holders}))
+        self.trayicon.setToolTip(
+            "acolyte - waiting for {} to exit".format(names))
+        self.trayicon.showMessage(
+            "steam-acolyte",
+            "Steam has exited, but {} still holds the steam pipe. Please "
+            "close it to continue.".format(names))
+
+    @trace.method
+    def show_milestone(self, name, seconds):
+        """Show the progress of steam's startup in the tray tooltip."""
+        if self.trayicon is not None:
+            self.trayicon.setToolTip("acolyte - steam {} after {:.1f} s".format(
+                MILESTONE_LABELS.get(name, name), seconds))
+
     @trace.method
     def show_waiting_message(self):
         """If we are in the background, show waiting message as balloon."""
@@ -277,9 +602,33 @@ def make_user_action(window, user):
         "Start steam login dialog to enter a different user account.")
     action.setIcon(QIcon(
         theme.user_icon if user.account_name else theme.plus_icon))
+    if user.account_name and window.apps:
+        action.setMenu(make_apps_menu(window, user))
     return action
 
 
+def make_apps_menu(window, user):
+    """Create a submenu for logging in the given user and directly launching
+    one of the installed apps. The menu is populated when first shown."""
+    menu = QMenu(window)
+
+    def populate():
+        menu.aboutToShow.disconnect(populate)
+        steam = menu.addAction(QIcon(window.theme.user_icon), "&Steam")
+        steam.triggered.connect(lambda: window.login(user.account_name))
+        menu.addSeparator()
+        for app in window.apps:
+            action = menu.addAction(app.name)
+            action.setToolTip("Login {} and launch {}".format(
+                user.account_name, app.name))
+            action.triggered.connect(
+                lambda _, app_id=app.app_id: window.login(
+                    user.account_name, ['-applaunch', app_id]))
+
+    menu.aboutToShow.connect(populate)
+    return menu
+
+
 class UserListWidget(QWidget):
     pass
 
@@ -288,7 +637,7 @@ class UserWidget(ButtonWidget):
 
     """A button widget for a single user. When clicked, logs in that user.
     Contains small buttons that delete the login token and remove the user
-    from the list."""
+    from the list. Ctrl+Click selects the user for bulk deletion."""
 
     def __init__(self, window, user):
         super().__init__(window)
@@ -336,13 +685,34 @@ class UserWidget(ButtonWidget):
         self.clicked.connect(self.login_clicked)
         self.update_ui()
 
+    def shows(self, user):
+        """Check whether the widget displays the given user correctly."""
+        return (self.user.account_name == user.account_name and
+                self.user.persona_name == user.persona_name)
+
     def login_clicked(self):
-        self.window().login(self.user.account_name)
+        modifiers = QApplication.keyboardModifiers()
+        if modifiers & (Qt.ControlModifier | Qt.ShiftModifier):
+            self.set_selected(not self.selected and bool(self.user.steam_id))
+        else:
+            self.window().login(self.user.account_name)
 
     def delete_clicked(self):
-        self.steam.remove_user(self.user.account_name)
-        self.hide()
-        self.window().adjustSize()
+        if self.selected:
+            self.window().delete_selected()
+        else:
+            self.window().delete_users([self])
+
+    @property
+    def selected(self):
+        return bool(self.property('selected'))
+
+    def set_selected(self, selected):
+        """Mark widget for bulk deletion."""
+        self.setProperty('selected', selected)
+        # Update the style sheet for the changed property:
+        self.style().unpolish(self)
+        self.style().polish(self)
 
     def update_ui(self):
         username = self.user.account_name
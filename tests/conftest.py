@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+import vdf
+
+
+USERS = {
+    'alice': ('76561197960287930', 'Alice', '1700000000'),
+    'bob': ('76561197960287931', 'Bob', '1700000100'),
+}
+
+
+def write_vdf(filename, data):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(vdf.dumps(data, pretty=True))
+
+
+@pytest.fixture
+def make_steam(tmp_path):
+    """Return a function that creates a fake steam installation with the
+    given accounts (by default alice and bob), and returns its
+    ``SteamConfig``."""
+    if sys.platform == 'win32':
+        pytest.skip("steam's config is located through the registry")
+    from steam_acolyte.config import SteamConfig
+    from steam_acolyte.vault import connect_cache_key
+
+    def make_steam(name, accounts=tuple(USERS)):
+        prefix = tmp_path / name
+        root = prefix / 'steam'
+        exe = prefix / 'steam.sh'
+        os.makedirs(str(root / 'config'))
+        exe.write_text('#! /bin/sh\n')
+        exe.chmod(0o755)
+        write_vdf(str(prefix / 'registry.vdf'), {'Registry': {'HKCU': {
+            'Software': {'Valve': {'Steam': {'AutoLoginUser': ''}}}}}})
+        write_vdf(str(root / 'config' / 'loginusers.vdf'), {'users': {
+            USERS[a][0]: {
+                'AccountName': a,
+                'PersonaName': USERS[a][1],
+                'RememberPassword': '1',
+                'Timestamp': USERS[a][2],
+            } for a in accounts}})
+        write_vdf(str(root / 'config' / 'config.vdf'), {
+            'InstallConfigStore': {'Software': {'Valve': {'Steam': {
+                'Accounts': {a: {'SteamID': USERS[a][0]} for a in accounts},
+                'ConnectCache': {
+                    connect_cache_key(a): 'token-' + a for a in accounts},
+            }}}}})
+        return SteamConfig(str(prefix), None, str(exe))
+
+    return make_steam
+
+
+def login(steam, account, persona, timestamp):
+    """Simulate a login of steam that changes the account's persona name."""
+    loginusers = steam.read_config('loginusers.vdf')
+    for info in loginusers['users'].values():
+        if info['AccountName'] == account:
+            info['PersonaName'] = persona
+            info['Timestamp'] = str(timestamp)
+    steam.write_config('loginusers.vdf', loginusers)
+
+
+def persona(steam, account):
+    """Return the persona name of the account, or ``None``."""
+    user = steam.users(update=False).by_account(account)
+    return user and user.persona_name
@@ -0,0 +1,56 @@
+from steam_acolyte.accounts import AccountFilter, AccountIndex
+from steam_acolyte.config import SteamUser
+
+
+def make_index():
+    return AccountIndex([
+        SteamUser('1', 'alice', 'Wonderland', '1700000000'),
+        SteamUser('2', 'bob', 'Builder', '1700000100'),
+        SteamUser('3', 'carol', 'Alice Cooper', '1700000200'),
+        SteamUser('4', 'dave', 'Ünïcode', '1700000300'),
+    ])
+
+
+def names(users):
+    return [u.account_name for u in users]
+
+
+def test_empty_query_matches_all_in_default_order():
+    index = make_index()
+    filt = AccountFilter(index)
+    assert filt.matches == tuple(index)
+    assert names(filt.update('  ')) == ['carol', 'bob', 'alice', 'dave']
+
+
+def test_matches_persona_or_account_name():
+    filt = AccountFilter(make_index())
+    assert names(filt.update('ALICE')) == ['carol', 'alice']
+    assert names(filt.update('build')) == ['bob']
+    assert names(filt.update('ünï')) == ['dave']
+    assert names(filt.update('xyz')) == []
+
+
+def test_query_does_not_span_persona_and_account_name():
+    filt = AccountFilter(make_index())
+    assert names(filt.update('builderbob')) == []
+    assert names(filt.update('builder bob')) == []
+
+
+def test_typing_narrows_and_deleting_restores():
+    filt = AccountFilter(make_index())
+    assert names(filt.update('a')) == ['carol', 'alice', 'dave']
+    assert names(filt.update('al')) == ['carol', 'alice']
+    assert names(filt.update('ali')) == ['carol', 'alice']
+    assert names(filt.update('alice c')) == ['carol']
+    # Deleting characters returns the previous results:
+    assert names(filt.update('al')) == ['carol', 'alice']
+    # A different query replaces the ones it doesn't extend:
+    assert names(filt.update('bo')) == ['bob']
+    assert names(filt.update('')) == ['carol', 'bob', 'alice', 'dave']
+
+
+def test_filter_on_index_without_removed_account():
+    index = make_index()
+    AccountFilter(index).update('alice')
+    filt = AccountFilter(index.without(['ALICE']))
+    assert names(filt.update('alice')) == ['carol']
@@ -0,0 +1,100 @@
+import io
+import os
+import stat
+import tarfile
+
+import pytest
+
+from steam_acolyte import archive
+
+from conftest import login, persona
+
+
+@pytest.fixture
+def filename(tmp_path):
+    return str(tmp_path / 'accounts.tar.gz')
+
+
+def test_round_trip(make_steam, filename):
+    a = make_steam('a')
+    b = make_steam('b', accounts=['bob'])
+    login(b, 'bob', 'Other', 1600000000)
+    assert archive.export_accounts(a, filename) == 2
+    assert stat.S_IMODE(os.stat(filename).st_mode) == 0o600
+    assert sorted(s['loginusers']['AccountName']
+                  for s in archive.read_archive(filename)) == ['alice', 'bob']
+    assert sorted(archive.import_accounts(b, filename)) == ['alice', 'bob']
+    assert persona(b, 'alice') == 'Alice'
+    assert persona(b, 'bob') == 'Bob'
+    for conf in ('loginusers.vdf', 'config.vdf'):
+        assert b.read_config(conf) == a.read_config(conf)
+    [snapshot] = [s for s in archive.read_archive(filename)
+                  if s['loginusers']['AccountName'] == 'alice']
+    assert b.vault.load('alice') == snapshot
+    # The import is one transaction that can be undone:
+    assert b.edits.undo()['desc'] == 'import ' + filename
+    assert persona(b, 'alice') is None
+    assert persona(b, 'bob') == 'Other'
+
+
+def test_import_keeps_other_accounts(make_steam, filename):
+    a = make_steam('a', accounts=['alice'])
+    b = make_steam('b', accounts=['bob'])
+    archive.export_accounts(a, filename)
+    assert archive.import_accounts(b, filename) == ['alice']
+    assert persona(b, 'alice') == 'Alice'
+    assert persona(b, 'bob') == 'Bob'
+
+
+def test_preview_import(make_steam, filename):
+    a = make_steam('a')
+    b = make_steam('b', accounts=['bob'])
+    archive.export_accounts(a, filename)
+    names, changes = archive.preview_import(b, filename)
+    assert sorted(names) == ['alice', 'bob']
+    loginusers = os.path.join(b.steam_config, 'loginusers.vdf')
+    assert set(changes) == {
+        loginusers, os.path.join(b.steam_config, 'config.vdf')}
+    with open(loginusers, 'rb') as f:
+        assert changes[loginusers][0] == f.read()
+    assert b'"alice"' in changes[loginusers][1]
+    out = io.StringIO()
+    archive.print_diff(b, changes, out)
+    assert '+++ b/config/loginusers.vdf' in out.getvalue()
+    # Nothing was written:
+    assert persona(b, 'alice') is None
+    assert b.edits.history() == []
+
+
+def test_import_of_identical_accounts_changes_nothing(make_steam, filename):
+    a = make_steam('a')
+    archive.export_accounts(a, filename)
+    assert archive.preview_import(a, filename)[1] == {}
+    archive.import_accounts(a, filename)
+    assert a.edits.history() == []
+
+
+def test_failed_export_leaves_no_file(make_steam, filename, monkeypatch):
+    a = make_steam('a')
+    original = a.snapshots
+
+    def snapshots():
+        yield from original()
+        raise OSError("disk full")
+
+    monkeypatch.setattr(a, 'snapshots', snapshots)
+    with pytest.raises(OSError):
+        archive.export_accounts(a, filename)
+    assert os.listdir(os.path.dirname(filename)) == ['a']
+
+
+def test_damaged_archive(make_steam, filename):
+    with tarfile.open(filename, 'w:gz') as tar:
+        data = b'{"steam_id": 1}'
+        info = tarfile.TarInfo(archive.PREFIX + 'x.json')
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    b = make_steam('b')
+    with pytest.raises(ValueError):
+        archive.import_accounts(b, filename)
+    assert b.edits.history() == []
@@ -0,0 +1,190 @@
+import os
+
+import pytest
+
+from steam_acolyte import editlog
+from steam_acolyte.editlog import EditLog
+
+
+@pytest.fixture
+def files(tmp_path):
+    a = str(tmp_path / 'a.vdf')
+    b = str(tmp_path / 'b.vdf')
+    with open(a, 'wb') as f:
+        f.write(b'head of a\nold tail of a\n')
+    with open(b, 'wb') as f:
+        f.write(b'head of b\nold tail of b\n')
+    return a, b
+
+
+@pytest.fixture
+def log(tmp_path):
+    return EditLog(str(tmp_path / 'acolyte' / 'edits.log'))
+
+
+def content(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+def test_transaction_writes_all_files(log, files):
+    a, b = files
+    with log.transaction('edit both'):
+        log.write(a, b'head of a\nnew tail\n')
+        assert log.read(a) == b'head of a\nnew tail\n'
+        assert log.modified(a) and not log.modified(b)
+        assert content(a) == b'head of a\nold tail of a\n'
+        log.write(b, b'head of b\n')
+    assert content(a) == b'head of a\nnew tail\n'
+    assert content(b) == b'head of b\n'
+    [entry] = log.history()
+    assert entry['desc'] == 'edit both'
+    assert entry['status'] == 'committed'
+    assert entry['files'] == [a, b]
+
+
+def test_dry_run_writes_nothing(log, files):
+    a, _ = files
+    with log.dry_run() as pending:
+        log.write(a, b'changed')
+    assert pending == {a: b'changed'}
+    assert content(a) == b'head of a\nold tail of a\n'
+    assert log.history() == []
+
+
+def test_unchanged_files_are_not_recorded(log, files):
+    a, _ = files
+    with log.transaction('nothing'):
+        log.write(a, content(a))
+    assert log.history() == []
+
+
+def crash_after_first_file(monkeypatch):
+    """Make ``patch_file()`` write the first file, and fail on the second
+    one after writing part of it."""
+    patch_file = editlog.patch_file
+    calls = []
+
+    def crashing_patch_file(filename, data, offset):
+        calls.append(filename)
+        if len(calls) == 1:
+            return patch_file(filename, data, offset)
+        with open(filename, 'r+b') as f:
+            f.seek(offset)
+            f.write(data[offset:offset + 3])
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(editlog, 'patch_file', crashing_patch_file)
+
+
+def test_recover_rolls_back_interrupted_transaction(
+        log, files, monkeypatch):
+    a, b = files
+    crash_after_first_file(monkeypatch)
+    with pytest.raises(KeyboardInterrupt):
+        with log.transaction('crash'):
+            log.write(a, b'head of a\nnew tail of a, much longer\n')
+            log.write(b, b'head of b\nnew tail of b\n')
+    assert content(a) != b'head of a\nold tail of a\n'
+    monkeypatch.undo()
+    # Next start:
+    restarted = EditLog(log.filename)
+    restarted.recover()
+    assert content(a) == b'head of a\nold tail of a\n'
+    assert content(b) == b'head of b\nold tail of b\n'
+    [entry] = restarted.history()
+    assert entry['status'] == 'aborted'
+    # Nothing left to undo:
+    assert restarted.undo() is None
+
+
+def test_recover_keeps_files_rewritten_since(log, files, monkeypatch):
+    a, b = files
+    crash_after_first_file(monkeypatch)
+    with pytest.raises(KeyboardInterrupt):
+        with log.transaction('crash'):
+            log.write(a, b'head of a\nnew tail\n')
+            log.write(b, b'head of b\nnew tail\n')
+    monkeypatch.undo()
+    # Steam rewrites a before acolyte is started again:
+    with open(a, 'wb') as f:
+        f.write(b'rewritten by steam\n')
+    EditLog(log.filename).recover()
+    assert content(a) == b'rewritten by steam\n'
+    assert content(b) == b'head of b\nold tail of b\n'
+
+
+def test_recover_ignores_torn_record(log, files):
+    a, _ = files
+    log.write(a, b'head of a\nnew tail\n')
+    with open(log.filename, 'ab') as f:
+        f.write(b'{"t": "begin", "seq": 2, "ed')
+    restarted = EditLog(log.filename)
+    restarted.recover()
+    assert content(a) == b'head of a\nnew tail\n'
+    restarted.write(a, b'head of a\nnewer tail\n')
+    assert [e['status'] for e in restarted.history()] == [
+        'committed', 'committed']
+
+
+def test_undo(log, files):
+    a, b = files
+    with log.transaction('first'):
+        log.write(a, b'head of a\nfirst\n')
+    with log.transaction('second'):
+        log.write(a, b'head of a\nsecond\n')
+        log.write(b, b'')
+        log.warn('something else happened')
+    undone = log.undo()
+    assert undone['desc'] == 'second'
+    assert undone['warn'] == ['something else happened']
+    assert content(a) == b'head of a\nfirst\n'
+    assert content(b) == b'head of b\nold tail of b\n'
+    # Undos are not undone themselves, but the transaction before:
+    assert EditLog(log.filename).undo()['desc'] == 'first'
+    assert content(a) == b'head of a\nold tail of a\n'
+    assert log.undo() is None
+    assert [e['status'] for e in log.history()] == [
+        'undone', 'undone', 'committed', 'committed']
+
+
+def test_undo_refuses_modified_files(log, files):
+    a, _ = files
+    log.write(a, b'head of a\nnew tail\n')
+    with open(a, 'ab') as f:
+        f.write(b'appended by steam\n')
+    with pytest.raises(RuntimeError):
+        log.undo()
+    assert content(a) == b'head of a\nnew tail\nappended by steam\n'
+
+
+def test_compact_to_half_the_size(log, files, monkeypatch):
+    a, _ = files
+    monkeypatch.setattr(editlog, 'COMPACT_SIZE', 8192)
+    tail = 'head of a\n{:03}\n'.format
+    sizes = []
+    for i in range(200):
+        log.write(a, (tail(i) * 10).encode())
+        sizes.append(os.path.getsize(log.filename))
+    assert max(sizes) <= 8192
+    # The journal has been compacted to half of the size, not further:
+    assert min(sizes[50:]) > 8192 // 4
+    history = log.history()
+    assert history[-1]['seq'] == 200
+    assert len(history) < 200
+    assert all(e['status'] == 'committed' for e in history)
+    # Sequence numbers and undo continue to work after compacting:
+    assert log.undo()['seq'] == 200
+    assert EditLog(log.filename).undo()['seq'] == 199
+    assert content(a) == (tail(197) * 10).encode()
+
+
+def test_compact_keeps_last_transaction(log, files, monkeypatch):
+    a, _ = files
+    monkeypatch.setattr(editlog, 'COMPACT_SIZE', 100)
+    log.write(a, b'head of a\n' + b'x' * 1000)
+    log.write(a, b'head of a\n' + b'y' * 1000)
+    [entry] = log.history()
+    assert entry['seq'] == 2
+    log.undo()
+    assert content(a) == b'head of a\n' + b'x' * 1000
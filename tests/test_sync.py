@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from steam_acolyte.sync import Sync
+
+from conftest import login, persona
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return str(tmp_path / 'shared')
+
+
+def sync(steam, shared):
+    # Each fake installation stands for a different machine:
+    machine = os.path.basename(steam.prefix)
+    return Sync(steam, shared, machine).run()
+
+
+def test_accounts_are_copied_to_other_machines(make_steam, shared):
+    a = make_steam('a')
+    b = make_steam('b', accounts=['bob'])
+    assert sync(a, shared) == {'exported': 2, 'imported': 0, 'removed': 0}
+    assert sync(b, shared) == {'exported': 0, 'imported': 1, 'removed': 0}
+    assert persona(b, 'alice') == 'Alice'
+    assert b.read_config('config.vdf') == a.read_config('config.vdf')
+    # Nothing changes once all machines are in sync:
+    assert sync(a, shared) == {'exported': 0, 'imported': 0, 'removed': 0}
+    assert sync(b, shared) == {'exported': 0, 'imported': 0, 'removed': 0}
+    assert b.edits.history()[-1]['desc'].startswith('sync with ')
+
+
+@pytest.mark.parametrize('order', ['ab', 'ba'])
+def test_newer_login_wins_conflict(make_steam, shared, order):
+    machines = {'a': make_steam('a'), 'b': make_steam('b')}
+    for name in 'ab':
+        sync(machines[name], shared)
+    login(machines['a'], 'alice', 'Later', 1800000000)
+    login(machines['b'], 'alice', 'Earlier', 1750000000)
+    # The order of syncing doesn't matter:
+    for name in order + order:
+        sync(machines[name], shared)
+    assert persona(machines['a'], 'alice') == 'Later'
+    assert persona(machines['b'], 'alice') == 'Later'
+
+
+def test_same_change_on_both_machines_is_no_conflict(make_steam, shared):
+    a = make_steam('a')
+    b = make_steam('b')
+    sync(a, shared)
+    sync(b, shared)
+    login(a, 'bob', 'Same', 1800000000)
+    login(b, 'bob', 'Same', 1800000000)
+    assert sync(a, shared)['exported'] == 1
+    assert sync(b, shared) == {'exported': 0, 'imported': 0, 'removed': 0}
+    assert sync(a, shared) == {'exported': 0, 'imported': 0, 'removed': 0}
+
+
+def test_stale_machine_does_not_overwrite_newer_login(make_steam, shared):
+    a = make_steam('a')
+    sync(a, shared)
+    login(a, 'alice', 'New', 1800000000)
+    sync(a, shared)
+    # A machine that joins later with an outdated copy of the account:
+    c = make_steam('c')
+    assert sync(c, shared)['imported'] == 1
+    assert persona(c, 'alice') == 'New'
+    sync(a, shared)
+    assert persona(a, 'alice') == 'New'
+
+
+def test_removal_is_propagated(make_steam, shared):
+    a = make_steam('a')
+    b = make_steam('b')
+    sync(a, shared)
+    sync(b, shared)
+    a.remove_users(['bob'])
+    assert sync(a, shared)['exported'] == 1
+    assert sync(b, shared)['removed'] == 1
+    assert persona(b, 'bob') is None
+    assert persona(b, 'alice') == 'Alice'
+
+
+def test_login_after_removal_brings_account_back(make_steam, shared):
+    a = make_steam('a')
+    b = make_steam('b')
+    sync(a, shared)
+    sync(b, shared)
+    a.remove_users(['bob'])
+    sync(a, shared)
+    login(b, 'bob', 'Back', 4000000000)
+    sync(b, shared)
+    assert persona(b, 'bob') == 'Back'
+    assert sync(a, shared)['imported'] == 1
+    assert persona(a, 'bob') == 'Back'
+
+
+def test_missing_snapshot_is_retried(make_steam, shared):
+    a = make_steam('a')
+    b = make_steam('b', accounts=['bob'])
+    sync(a, shared)
+    objects = os.path.join(shared, 'objects')
+    hidden = objects + '.hidden'
+    os.rename(objects, hidden)
+    assert sync(b, shared)['imported'] == 0
+    assert persona(b, 'alice') is None
+    os.rename(hidden, objects)
+    assert sync(b, shared)['imported'] == 1
+    assert persona(b, 'alice') == 'Alice'
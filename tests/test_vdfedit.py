@@ -0,0 +1,100 @@
+import vdf
+
+from steam_acolyte import vdfedit
+
+
+CONFIG = b'''\
+"InstallConfigStore"
+{
+\t"Software"
+\t{
+\t\t"Valve"
+\t\t{
+\t\t\t"Steam"
+\t\t\t{
+\t\t\t\t"Accounts"
+\t\t\t\t{
+\t\t\t\t\t"alice"
+\t\t\t\t\t{
+\t\t\t\t\t\t"SteamID"\t\t"76561197960287930"
+\t\t\t\t\t}
+\t\t\t\t}
+\t\t\t\t// comment with "quotes" and { braces
+\t\t\t\t"ConnectCache"
+\t\t\t\t{
+\t\t\t\t\t"abcdef011"\t\t"token \\"A\\""
+\t\t\t\t}
+\t\t\t}
+\t\t}
+\t}
+}
+'''
+
+STEAM = r'InstallConfigStore\Software\Valve\Steam'
+
+
+def parse(data):
+    return vdf.loads(data.decode('utf-8'))
+
+
+def steam_section(data):
+    return parse(data)['InstallConfigStore']['Software']['Valve']['Steam']
+
+
+def test_lookup_nested():
+    entry = vdfedit.lookup(CONFIG, STEAM + r'\Accounts\alice\SteamID')
+    assert entry.key == 'SteamID'
+    assert vdfedit.parse_value(CONFIG, entry) == '76561197960287930'
+
+
+def test_lookup_is_case_insensitive():
+    entry = vdfedit.lookup(CONFIG, STEAM.lower() + r'\accounts\ALICE')
+    assert entry.key == 'alice'
+    assert vdfedit.is_object(CONFIG, entry)
+    assert vdfedit.parse_value(CONFIG, entry) == {
+        'SteamID': '76561197960287930'}
+
+
+def test_lookup_skips_comments_and_unescapes():
+    entry = vdfedit.lookup(CONFIG, STEAM + r'\ConnectCache\abcdef011')
+    assert vdfedit.parse_value(CONFIG, entry) == 'token "A"'
+
+
+def test_lookup_missing():
+    assert vdfedit.lookup(CONFIG, STEAM + r'\Accounts\bob') is None
+    assert vdfedit.lookup(CONFIG, r'Missing\Steam') is None
+    # Can't descend into a string value:
+    assert vdfedit.lookup(
+        CONFIG, STEAM + r'\Accounts\alice\SteamID\x') is None
+
+
+def test_set_entry_replaces_in_place():
+    data, offset = vdfedit.set_entry(
+        CONFIG, STEAM + r'\Accounts', 'ALICE', {'SteamID': '1'})
+    assert data[:offset] == CONFIG[:offset]
+    assert data.endswith(CONFIG[CONFIG.index(b'\t\t\t\t// comment'):])
+    # The original spelling of the key is kept:
+    assert steam_section(data)['Accounts'] == {'alice': {'SteamID': '1'}}
+
+
+def test_set_entry_inserts_into_existing_object():
+    data, offset = vdfedit.set_entry(
+        CONFIG, STEAM + r'\ConnectCache', 'new', 'token')
+    assert data[:offset] == CONFIG[:offset]
+    assert steam_section(data)['ConnectCache'] == {
+        'abcdef011': 'token "A"', 'new': 'token'}
+    assert steam_section(data)['Accounts'] == steam_section(CONFIG)['Accounts']
+
+
+def test_set_entry_creates_missing_parents():
+    data, _ = vdfedit.set_entry(
+        CONFIG, STEAM + r'\Missing\Deeper', 'key', {'nested': 'value'})
+    assert steam_section(data)['Missing'] == {
+        'Deeper': {'key': {'nested': 'value'}}}
+    assert vdfedit.lookup(data, STEAM + r'\ConnectCache\abcdef011')
+
+
+def test_set_entry_in_empty_document():
+    data, offset = vdfedit.set_entry(b'', 'users', 'key', 'value')
+    assert offset == 0
+    assert parse(data) == {'users': {'key': 'value'}}
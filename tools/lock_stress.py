@@ -0,0 +1,223 @@
+"""
+Stress test for the instance locking of many concurrent acolyte processes.
+
+Usage:
+    lock_stress.py [-n N] [-t SECONDS] [--keep]
+    lock_stress.py --worker PREFIX EXE START EXPECT TIMEOUT
+
+Options:
+    -n N, --count N             Number of acolyte instances [default: 64]
+    -t SECONDS, --timeout SECONDS
+                                Seconds to wait for forwarded commands
+                                [default: 30]
+    --keep                      Don't delete the fake steam prefix
+
+Creates a fake steam prefix in a temporary folder, and starts N worker
+processes that simultaneously try to acquire the acolyte and steam locks in
+the same way as ``steam-acolyte`` does. Verifies that exactly one of them
+becomes the first instance, and that all others connect to it and forward
+their ``-foreground`` command. Prints histograms of the lock acquisition and
+forwarding latencies.
+
+Linux only. Run from the repository root, or with steam_acolyte installed.
+"""
+
+from docopt import docopt
+
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import sleep, time
+
+
+REGISTRY = """\
+"Registry"
+{
+    "HKCU" { "Software" { "Valve" { "Steam" {
+        "AutoLoginUser" "stress"
+    } } } }
+}
+"""
+
+CONFIG = """\
+"InstallConfigStore"
+{
+    "Software" { "Valve" { "Steam" { "Accounts" { } } } }
+}
+"""
+
+LOGINUSERS = """\
+"users"
+{
+}
+"""
+
+FAKE_STEAM = """\
+#!/bin/sh
+exit 0
+"""
+
+# Tag appended to the forwarded command, so that the first instance can tell
+# where it came from and when it was sent:
+TAG = 'acolyte-stress:{}:{!r}'
+
+
+def main(args=None):
+    opts = docopt(__doc__, args)
+    if opts['--worker']:
+        return worker(
+            opts['PREFIX'], opts['EXE'], float(opts['START']),
+            int(opts['EXPECT']), float(opts['TIMEOUT']))
+    count = int(opts['--count'])
+    timeout = float(opts['--timeout'])
+    prefix = tempfile.mkdtemp(prefix='acolyte-stress-')
+    try:
+        exe = create_prefix(prefix)
+        results = run_workers(prefix, exe, count, timeout)
+        return report(results, count)
+    finally:
+        if opts['--keep']:
+            print("Kept fake prefix:", prefix)
+        else:
+            shutil.rmtree(prefix)
+
+
+def create_prefix(prefix):
+    """Create a fake steam prefix. Returns path of the fake steam exe."""
+    config = os.path.join(prefix, 'steam', 'config')
+    os.makedirs(config)
+    files = {
+        os.path.join(prefix, 'registry.vdf'): REGISTRY,
+        os.path.join(config, 'config.vdf'): CONFIG,
+        os.path.join(config, 'loginusers.vdf'): LOGINUSERS,
+        os.path.join(prefix, 'steam.sh'): FAKE_STEAM,
+    }
+    for filename, text in files.items():
+        with open(filename, 'w') as f:
+            f.write(text)
+    exe = os.path.join(prefix, 'steam.sh')
+    os.chmod(exe, 0o755)
+    return exe
+
+
+def run_workers(prefix, exe, count, timeout):
+    """Start workers, and return their results."""
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [root, env.get('PYTHONPATH')]))
+    # Give all workers time to start up and import Qt before the race:
+    start = time() + 2 + count * 0.05
+    procs = [
+        subprocess.Popen([
+            sys.executable, __file__, '--worker', prefix, exe,
+            repr(start), str(count - 1), str(timeout),
+        ], env=env, stdout=subprocess.PIPE, universal_newlines=True)
+        for _ in range(count)
+    ]
+    results = []
+    for proc in procs:
+        out, _ = proc.communicate()
+        try:
+            results.append(json.loads(out))
+        except ValueError:
+            results.append({'error': 'exit code {}'.format(proc.returncode)})
+    return results
+
+
+def worker(prefix, exe, start, expect, timeout):
+    """Executed in the worker processes."""
+    from PyQt5.QtCore import QCoreApplication, QTimer
+    from steam_acolyte.steam import Steam
+    app = QCoreApplication([])
+    steam = Steam(prefix, exe=exe)
+    ident = os.getpid()
+
+    sleep(max(start - time(), 0))
+    t0 = time()
+    first, locked = steam.lock(['-foreground', TAG.format(ident, time())])
+    result = {
+        'pid': ident,
+        'first': first,
+        'locked': locked,
+        'lock': time() - t0,
+    }
+    if locked:
+        received = result['received'] = []
+
+        def on_command(line):
+            now = time()
+            args = shlex.split(line)
+            tag = args[-1].split(':') if args else []
+            received.append({
+                'ok': args[1:2] == ['-foreground'],
+                'latency': now - float(tag[2]) if len(tag) == 3 else None,
+            })
+            if len(received) >= expect:
+                app.quit()
+
+        steam.command_received.connect(on_command)
+        if expect:
+            QTimer.singleShot(int(timeout * 1000), app.quit)
+            app.exec_()
+        steam.unlock()
+        steam.release_acolyte_instance_lock()
+    print(json.dumps(result))
+    return 0
+
+
+def report(results, count):
+    """Print summary. Returns exit code."""
+    errors = [r for r in results if 'error' in r]
+    firsts = [r for r in results if r.get('first')]
+    lockers = [r for r in results if r.get('locked')]
+    received = [c for r in lockers for c in r['received']]
+    ok = [c for c in received if c['ok']]
+
+    print("instances:           {}".format(count))
+    print("crashed:             {}".format(len(errors)))
+    print("first instances:     {}".format(len(firsts)))
+    print("steam lock holders:  {}".format(len(lockers)))
+    print("forwarded commands:  {} of {} ({} well-formed)".format(
+        len(received), count - 1, len(ok)))
+    print()
+    histogram("lock acquisition", [r['lock'] for r in results if 'lock' in r])
+    histogram("forwarding", [c['latency'] for c in ok
+                             if c['latency'] is not None])
+
+    success = (not errors and len(firsts) == 1 and len(lockers) == 1 and
+               firsts == lockers and len(ok) == count - 1)
+    print("PASSED" if success else "FAILED")
+    return 0 if success else 1
+
+
+def histogram(title, values, width=40):
+    """Print histogram of latencies in logarithmic millisecond buckets."""
+    print("{} latency ({} samples):".format(title, len(values)))
+    if not values:
+        print()
+        return
+    buckets = {}
+    for value in values:
+        bucket = 0
+        while 2 ** bucket < value * 1000:
+            bucket += 1
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+    peak = max(buckets.values())
+    for bucket in range(min(buckets), max(buckets) + 1):
+        num = buckets.get(bucket, 0)
+        print("  <= {:>6} ms {:>5} {}".format(
+            2 ** bucket, num, '#' * (num * width // peak)))
+    values = sorted(values)
+    print("  min {:.1f} ms, median {:.1f} ms, max {:.1f} ms".format(
+        values[0] * 1000, values[len(values) // 2] * 1000,
+        values[-1] * 1000))
+    print()
+
+
+if __name__ == '__main__':
+    sys.exit(main())